@@ -0,0 +1,34 @@
+"""
+Shared LaTeX rendering for the universal-math-exam recipes.
+
+- config: font size, fontset, renderer and output settings
+- fields: the item and task field names, without importing the renderer
+- tokenizer: splits item text into text and LaTeX segments
+- latex: renders expressions to SVG and replaces them in text
+- compact: smaller SVG markup, with glyphs shared per task
+- katex: the browser-side typesetting used with LATEX_OUTPUT=katex
+- cache, assets: the persistent SVG cache and the static asset store
+- parallel: pre-renders expressions across a pool of processes
+- templates, tasks: the compiled Jinja templates and the task builders
+- compiled: manifests for tasks built by scripts/compile-tasks.py
+- routing: the --overlap task router for double annotation
+- journal: the --journal write-behind buffer for saved answers
+- serving: hashing and startup helpers for the recipes (needs Prodigy)
+"""
+import importlib
+
+# Imported on first use, so that scripts which only need a light module such
+# as fields don't load matplotlib
+_EXPORTS = {
+    "configure": "config",
+    "settings": "config",
+    "process_latex_in_text": "latex",
+    "get_template": "templates",
+}
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
@@ -0,0 +1,75 @@
+"""
+Content-addressed store for rendered SVGs that are served as static files.
+
+With LATEX_OUTPUT=asset, each distinct SVG is written once to the asset
+directory, named after the hash of its content, and tasks link to it by URL
+instead of embedding it. The browser can then cache repeated expressions,
+and the tasks saved to the database stay small.
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+DEFAULT_ASSET_DIR = ".cache/latex-assets"
+DEFAULT_ASSET_ROUTE = "/latex-assets"
+
+
+class AssetStore:
+    def __init__(self, directory, route=DEFAULT_ASSET_ROUTE):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.route = route.rstrip("/")
+
+    def put(self, svg):
+        """Store SVG bytes and return the asset's file name."""
+        name = f"{hashlib.sha256(svg).hexdigest()[:32]}.svg"
+        path = self.directory / name
+        if not path.exists():
+            # Write to a temporary file and rename it into place, so another
+            # process never serves or reads a partially written asset
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as file_:
+                file_.write(svg)
+            os.replace(tmp_path, path)
+        return name
+
+    def url(self, name):
+        return f"{self.route}/{name}"
+
+
+def open_asset_store():
+    """
+    Open the asset store configured by the LATEX_ASSET_DIR and
+    LATEX_ASSET_ROUTE environment variables.
+    """
+    return AssetStore(
+        os.getenv("LATEX_ASSET_DIR", DEFAULT_ASSET_DIR),
+        route=os.getenv("LATEX_ASSET_ROUTE", DEFAULT_ASSET_ROUTE),
+    )
+
+
+def mount_assets(store):
+    """
+    Serve the asset store's directory from Prodigy's web app. The files never
+    change once written, so browsers may cache them indefinitely.
+    """
+    from prodigy.app import app
+    from starlette.routing import Mount
+    from starlette.staticfiles import StaticFiles
+
+    class ImmutableStaticFiles(StaticFiles):
+        def file_response(self, *args, **kwargs):
+            response = super().file_response(*args, **kwargs)
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+            return response
+
+    if any(getattr(route, "path", None) == store.route for route in app.routes):
+        return
+    # Put the route first so none of Prodigy's own routes can shadow it
+    mount = Mount(
+        store.route,
+        app=ImmutableStaticFiles(directory=store.directory),
+        name="latex-assets",
+    )
+    app.router.routes.insert(0, mount)
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = ".cache/latex-svg"
+DEFAULT_MAX_MB = 256
+
+
+class SVGCache:
+    """
+    Persistent, content-addressed store for rendered LaTeX SVGs.
+
+    Entries are keyed on a hash of the expression and the settings that
+    affect its rendering, and live in a SQLite database so that several
+    Prodigy processes can share the same cache directory. When the total
+    size exceeds `max_bytes`, the least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.path = Path(cache_dir) / "svg-cache.sqlite3"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        # Prodigy reads the stream, and so renders, from other threads than
+        # the one that opened the cache, so they share the connection
+        self._lock = threading.Lock()
+        # isolation_level=None lets us manage transactions explicitly
+        self.conn = sqlite3.connect(
+            self.path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS svg ("
+            " key TEXT PRIMARY KEY,"
+            " data BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS svg_accessed ON svg (accessed)")
+
+    @staticmethod
+    def key(latex_str, **settings):
+        """Return the content hash for an expression and its render settings."""
+        payload = json.dumps({"latex": latex_str, **settings}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT data FROM svg WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute(
+                "UPDATE svg SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+        return bytes(row[0])
+
+    def put(self, key, data):
+        # BEGIN IMMEDIATE takes the write lock up front, so the size check and
+        # eviction can't interleave with another process doing the same
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO svg (key, data, size, accessed)"
+                    " VALUES (?, ?, ?, ?)",
+                    (key, data, len(data), time.time()),
+                )
+                self._evict()
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM svg").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.conn.execute("SELECT key, size FROM svg ORDER BY accessed ASC")
+        evict = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evict.append((key,))
+            total -= size
+        self.conn.executemany("DELETE FROM svg WHERE key = ?", evict)
+
+    def stats(self):
+        with self._lock:
+            entries, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM svg"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+def open_cache():
+    """
+    Open the cache configured by the LATEX_CACHE_DIR and LATEX_CACHE_MAX_MB
+    environment variables. Setting LATEX_CACHE_DIR to an empty string
+    disables caching and returns None.
+    """
+    cache_dir = os.getenv("LATEX_CACHE_DIR", DEFAULT_CACHE_DIR)
+    if not cache_dir:
+        return None
+    max_mb = float(os.getenv("LATEX_CACHE_MAX_MB", DEFAULT_MAX_MB))
+    return SVGCache(cache_dir, max_bytes=int(max_mb * 1024 * 1024))
@@ -0,0 +1,122 @@
+"""
+Shrink the SVGs matplotlib writes, and share glyphs between them.
+
+compact_svg drops what a browser doesn't need (the XML prolog, metadata,
+comments, the style block and element ids), removes the whitespace in path
+data and rounds coordinates to a number of decimals. With LATEX_OUTPUT=svg
+the SVGs are inlined in the task HTML, and share_glyphs then moves the glyph
+outlines the figure renderer defines in every image into one <defs> per task,
+so each digit or letter is only sent once however often it's used.
+"""
+import re
+
+# Elements a browser ignores when drawing the image
+DROP_PATTERN = re.compile(
+    r"<\?xml.*?\?>|<!DOCTYPE.*?>|<metadata>.*?</metadata>|<!--.*?-->"
+    r"|<style.*?</style>",
+    re.DOTALL,
+)
+# Ids of matplotlib's figure, axes and text groups, which would clash when
+# several images are inlined in one page
+GROUP_ID_PATTERN = re.compile(r' id="(?:figure|axes|text|patch)_\d+"')
+EMPTY_DEFS_PATTERN = re.compile(r"<defs>\s*</defs>")
+NUMBER_ATTRIBUTE_PATTERN = re.compile(r' (d|transform)="([^"]*)"')
+NUMBER_PATTERN = re.compile(r"-?\d+\.\d+")
+# Only offsets are rounded in transforms: a rounded scale would be off by a
+# lot more once it's applied to the glyphs' font units
+TRANSLATE_PATTERN = re.compile(r"translate\([^)]*\)")
+PATH_SPACE_PATTERN = re.compile(r"\s*([MLQCZz])\s*")
+TAG_SPACE_PATTERN = re.compile(r">\s+<")
+GROUP_TAG_PATTERN = re.compile(r"<g>|<g |</g>")
+
+DEFS_PATTERN = re.compile(r"<defs>(.*?)</defs>", re.DOTALL)
+GLYPH_PATTERN = re.compile(r'<path id="[^"]+"[^>]*/>')
+GLYPH_ID_PATTERN = re.compile(r'id="([^"]+)"')
+
+
+def _round(match, precision):
+    text = f"{float(match.group(0)):.{precision}f}".rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+def _round_numbers(text, precision):
+    return NUMBER_PATTERN.sub(lambda match: _round(match, precision), text)
+
+
+def _compact_attribute(match, precision):
+    name, value = match.groups()
+    if name == "d":
+        if precision is not None:
+            value = _round_numbers(value, precision)
+        value = PATH_SPACE_PATTERN.sub(r"\1", value).strip()
+    elif precision is not None:
+        value = TRANSLATE_PATTERN.sub(
+            lambda match: _round_numbers(match.group(0), precision), value
+        )
+    return f' {name}="{value}"'
+
+
+def _unwrap_groups(text):
+    """Remove the <g> elements that have no attributes, keeping their content."""
+    pieces = []
+    bare = []  # for each open group, whether it has no attributes
+    position = 0
+    for match in GROUP_TAG_PATTERN.finditer(text):
+        tag = match.group(0)
+        if tag == "<g ":
+            bare.append(False)
+            continue
+        remove = bare.pop() if tag == "</g>" else True
+        if tag == "<g>":
+            bare.append(True)
+        if remove:
+            pieces.append(text[position : match.start()])
+            position = match.end()
+    pieces.append(text[position:])
+    return "".join(pieces)
+
+
+def compact_svg(svg, precision=None):
+    """
+    Return `svg` (bytes) without the parts a browser doesn't need, and with
+    path and transform coordinates rounded to `precision` decimals if given.
+    """
+    text = svg.decode("utf8")
+    text = DROP_PATTERN.sub("", text)
+    text = GROUP_ID_PATTERN.sub("", text)
+    text = EMPTY_DEFS_PATTERN.sub("", text)
+    text = NUMBER_ATTRIBUTE_PATTERN.sub(
+        lambda match: _compact_attribute(match, precision), text
+    )
+    # Browsers support plain href, so the xlink namespace isn't needed
+    text = text.replace("xlink:href=", "href=")
+    text = text.replace(' xmlns:xlink="http://www.w3.org/1999/xlink"', "")
+    text = text.replace(' version="1.1"', "")
+    text = _unwrap_groups(text)
+    return TAG_SPACE_PATTERN.sub("><", text).strip().encode("utf8")
+
+
+def share_glyphs(html):
+    """
+    Move the glyph definitions of the SVGs inlined in `html` into a single
+    hidden <defs> at the start, keeping one copy of each. matplotlib names
+    glyphs after their font and character, so equal ids are equal outlines.
+    """
+    glyphs = {}
+
+    def collect(match):
+        content = match.group(1)
+        # Leave any other definitions where they are
+        if GLYPH_PATTERN.sub("", content).strip():
+            return match.group(0)
+        for glyph in GLYPH_PATTERN.findall(content):
+            glyphs.setdefault(GLYPH_ID_PATTERN.search(glyph).group(1), glyph)
+        return ""
+
+    html = DEFS_PATTERN.sub(collect, html)
+    if not glyphs:
+        return html
+    return (
+        '<svg width="0" height="0" style="position:absolute" aria-hidden="true">'
+        f"<defs>{''.join(glyphs.values())}</defs></svg>{html}"
+    )
@@ -0,0 +1,70 @@
+"""
+Manifest for precompiled task files written by scripts/compile-tasks.py.
+
+Each output directory has a manifest.json recording, for every compiled
+file, the hashes of its source JSONL, the template and the renderer that
+produced it. A file only needs rebuilding when one of those changes.
+"""
+import hashlib
+import json
+from pathlib import Path
+
+import matplotlib
+
+from . import config
+
+MANIFEST_NAME = "manifest.json"
+
+PACKAGE_DIR = Path(__file__).parent
+
+
+def file_hash(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def renderer_hash():
+    """Hash of the rendering code and the settings that affect its output."""
+    digest = hashlib.sha256()
+    for path in sorted(PACKAGE_DIR.glob("*.py")):
+        digest.update(path.read_bytes())
+    settings = {**config.settings(), "matplotlib": matplotlib.__version__}
+    digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def fingerprint(source, template, recipe):
+    return {
+        "recipe": recipe,
+        "source": str(source),
+        "source_hash": file_hash(source),
+        "template": str(template),
+        "template_hash": file_hash(template),
+        "renderer_hash": renderer_hash(),
+    }
+
+
+def read_manifest(compiled_dir):
+    path = Path(compiled_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def write_manifest(compiled_dir, manifest):
+    path = Path(compiled_dir) / MANIFEST_NAME
+    path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+
+
+def stale_files(compiled_dir):
+    """
+    Return the compiled files in `compiled_dir` whose source, template or
+    renderer has changed since they were built.
+    """
+    stale = []
+    for name, entry in read_manifest(compiled_dir).items():
+        source, template = Path(entry["source"]), Path(entry["template"])
+        if not source.exists() or not template.exists():
+            stale.append(name)
+        elif fingerprint(source, template, entry["recipe"]) != entry:
+            stale.append(name)
+    return stale
@@ -0,0 +1,72 @@
+"""
+Rendering settings shared by every recipe and script that uses ume_render.
+
+Each setting is read from an environment variable at import time and can be
+changed for the current process with configure(). Code that depends on a
+setting reads it from this module when it's used, so a change applies
+everywhere at once.
+"""
+import os
+
+from matplotlib import rcParams
+
+# Font size of rendered expressions, in points
+FONTSIZE = float(os.getenv("LATEX_FONTSIZE", "14"))
+
+# matplotlib mathtext fontset, e.g. "cm" (Computer Modern, TeX-like) or "stix"
+FONTSET = os.getenv("LATEX_FONTSET", "cm")
+
+# "figure" draws each expression on a matplotlib figure and saves it with the
+# SVG backend; "mathtext" lays it out with the mathtext parser only (faster)
+RENDERER = os.getenv("LATEX_RENDERER", "figure")
+
+# "inline" embeds each SVG in the HTML as a base64 data URI; "asset" stores
+# it once under its content hash and links to it (see assets.py); "svg"
+# inlines the SVG markup itself, with the glyphs shared per task (see
+# compact.py); "katex" renders nothing and sends the LaTeX itself, for KaTeX
+# to typeset in the browser (see katex.py)
+OUTPUT = os.getenv("LATEX_OUTPUT", "inline")
+
+# Decimals kept in SVG coordinates. If set, SVGs are also stripped of
+# metadata and whitespace before they're sent (see compact.py)
+_precision = os.getenv("LATEX_SVG_PRECISION", "")
+SVG_PRECISION = int(_precision) if _precision else None
+
+RENDERERS = ["figure", "mathtext"]
+OUTPUTS = ["inline", "asset", "svg", "katex"]
+
+
+def settings():
+    """The current settings, as keyword arguments for configure()."""
+    return {
+        "fontsize": FONTSIZE,
+        "fontset": FONTSET,
+        "renderer": RENDERER,
+        "output": OUTPUT,
+        "svg_precision": SVG_PRECISION,
+    }
+
+
+def configure(
+    fontsize=None, fontset=None, renderer=None, output=None, svg_precision=None
+):
+    """Change the settings for this process. None leaves a setting as is."""
+    global FONTSIZE, FONTSET, RENDERER, OUTPUT, SVG_PRECISION
+    if renderer is not None and renderer not in RENDERERS:
+        raise ValueError(f"Unknown LaTeX renderer {renderer!r}, use one of {RENDERERS}")
+    if output is not None and output not in OUTPUTS:
+        raise ValueError(f"Unknown LaTeX output {output!r}, use one of {OUTPUTS}")
+    if fontsize is not None:
+        FONTSIZE = float(fontsize)
+    if fontset is not None:
+        FONTSET = fontset
+    if renderer is not None:
+        RENDERER = renderer
+    if output is not None:
+        OUTPUT = output
+    if svg_precision is not None:
+        SVG_PRECISION = int(svg_precision)
+    rcParams["mathtext.fontset"] = FONTSET
+
+
+configure(**settings())
@@ -0,0 +1,13 @@
+"""
+Names of the item and task fields, shared by the recipes and the scripts.
+
+This module imports nothing, so scripts that only need the field names
+(annotation_store.py, ingest.py) don't load the renderer.
+"""
+TEXT_KEYS = ["question", "choice_A", "choice_B", "choice_C", "choice_D"]
+
+# Fields that only exist to show the task, and can be rebuilt from the text
+RATING_RENDER_FIELDS = [f"display_{key}" for key in TEXT_KEYS] + ["html"]
+ADJUDICATION_RENDER_FIELDS = (
+    [f"a_{key}" for key in TEXT_KEYS] + [f"b_{key}" for key in TEXT_KEYS] + ["html"]
+)
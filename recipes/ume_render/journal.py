@@ -0,0 +1,193 @@
+"""
+Save answers to a local journal first and to Prodigy's database later.
+
+JournaledDatabase wraps the database a recipe saves to. add_examples appends
+the answers to a SQLite file in WAL mode and returns as soon as they're on
+disk, and a background thread saves them to the database in batches,
+retrying with a growing delay while it's slow or unavailable. Answers are
+only removed from the journal once the database has them, so the ones left
+when the process stops are saved after the next start. The reads recipes
+and Prodigy use to skip answered tasks include the answers still waiting in
+the journal. Everything else is passed through to the database.
+"""
+import atexit
+import json
+import sqlite3
+import threading
+
+# Most answers saved to the database in one call
+BATCH_SIZE = 100
+# Seconds the worker waits for new answers before checking again
+FLUSH_INTERVAL = 5.0
+# Delay before retrying a failed save, doubled up to the maximum
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 60.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    datasets TEXT NOT NULL,
+    input_hash INTEGER,
+    task_hash INTEGER,
+    example TEXT NOT NULL
+)
+"""
+
+
+class JournaledDatabase:
+    def __init__(self, db, path, batch_size=BATCH_SIZE, interval=FLUSH_INTERVAL):
+        self.db = db
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self.saved = 0
+        self.failures = 0
+        # The request threads append while the worker reads and deletes
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Sync each append, so an answer that was acknowledged can't be lost
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+        # Answers left from an earlier run are saved first
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    def __contains__(self, name):
+        return name in self.db or any(
+            name in datasets for datasets, _, _ in self._pending_hashes()
+        )
+
+    @property
+    def pending(self):
+        """The number of answers waiting to be saved to the database."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+    def add_examples(self, examples, datasets=()):
+        """Append `examples` to the journal, to be saved to `datasets` later."""
+        rows = [
+            (
+                json.dumps(list(datasets)),
+                eg.get("_input_hash"),
+                eg.get("_task_hash"),
+                json.dumps(eg),
+            )
+            for eg in examples
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO answers (datasets, input_hash, task_hash, example) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+        self._wake.set()
+
+    def get_input_hashes(self, *names):
+        hashes = set(self.db.get_input_hashes(*names))
+        return hashes | self._journal_hashes(names, 1)
+
+    def get_task_hashes(self, *names):
+        hashes = set(self.db.get_task_hashes(*names))
+        return hashes | self._journal_hashes(names, 2)
+
+    def get_dataset_examples(self, name, **kwargs):
+        examples = list(self.db.get_dataset_examples(name, **kwargs))
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT datasets, example FROM answers ORDER BY id"
+            ).fetchall()
+        for datasets, example in rows:
+            if name in json.loads(datasets):
+                examples.append(json.loads(example))
+        return examples
+
+    def _pending_hashes(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT datasets, input_hash, task_hash FROM answers"
+            ).fetchall()
+        return [(json.loads(datasets), *hashes) for datasets, *hashes in rows]
+
+    def _journal_hashes(self, names, column):
+        return {
+            row[column]
+            for row in self._pending_hashes()
+            if row[column] is not None and any(name in row[0] for name in names)
+        }
+
+    def flush(self):
+        """
+        Save the journal's answers to the database, oldest first, in batches.
+        Raises the database's error if a batch can't be saved; the answers
+        not yet saved stay in the journal.
+        """
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    rows = self._conn.execute(
+                        "SELECT id, datasets, example FROM answers ORDER BY id "
+                        "LIMIT ?",
+                        (self.batch_size,),
+                    ).fetchall()
+                if not rows:
+                    return
+                # Consecutive answers for the same datasets are saved together
+                start = 0
+                for end in range(1, len(rows) + 1):
+                    if end < len(rows) and rows[end][1] == rows[start][1]:
+                        continue
+                    batch = rows[start:end]
+                    examples = [json.loads(example) for _, _, example in batch]
+                    self.db.add_examples(examples, datasets=json.loads(batch[0][1]))
+                    with self._lock, self._conn:
+                        self._conn.executemany(
+                            "DELETE FROM answers WHERE id = ?",
+                            [(row[0],) for row in batch],
+                        )
+                    self.saved += len(batch)
+                    start = end
+
+    def _run(self):
+        delay = RETRY_DELAY
+        while not self._stop.is_set():
+            try:
+                self.flush()
+            except Exception as e:
+                self.failures += 1
+                print(
+                    f"WARNING: couldn't save answers to the database, "
+                    f"retrying in {delay:g}s: {e}"
+                )
+                self._stop.wait(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+                continue
+            delay = RETRY_DELAY
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def close(self, timeout=10.0):
+        """Stop the worker and try once more to save what's left."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._wake.set()
+        self._worker.join(timeout)
+        try:
+            # Leave it to the next start if the worker is stuck on a save
+            if not self._worker.is_alive():
+                self.flush()
+        except Exception as e:
+            print(f"WARNING: couldn't save answers to the database: {e}")
+        if self.pending:
+            print(f"{self.pending} answers left in {self.path}, saved on next start")
+        with self._lock:
+            self._conn.close()
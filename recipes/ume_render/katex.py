@@ -0,0 +1,25 @@
+"""
+Client-side math for LATEX_OUTPUT=katex.
+
+With this output nothing is rendered on the server: each expression is sent
+as its LaTeX in a <span class="latex-math">, and the recipe's javascript
+typesets it in the browser with the copy of KaTeX in static/katex/, so no CDN
+or network access is needed. KaTeX is asked for MathML, which browsers
+display natively, so its CSS and fonts aren't needed either.
+"""
+from pathlib import Path
+
+from . import config
+
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+SCRIPTS = [STATIC_DIR / "katex" / "katex.min.js", STATIC_DIR / "typeset-math.js"]
+
+
+def recipe_javascript(*scripts):
+    """
+    The `javascript` setting for a recipe running the given scripts, with
+    KaTeX and the typesetting script added when config.OUTPUT is "katex".
+    """
+    if config.OUTPUT == "katex":
+        scripts = [*scripts, *(path.read_text("utf8") for path in SCRIPTS)]
+    return "\n".join(scripts)
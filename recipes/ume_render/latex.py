@@ -0,0 +1,358 @@
+import base64
+import html
+import time
+from io import BytesIO
+
+import matplotlib
+import matplotlib.pyplot as plt
+from matplotlib import rcParams
+
+from . import config, mathtext_svg, timing
+from .assets import open_asset_store
+from .cache import open_cache
+from .compact import compact_svg
+from .tokenizer import find_latex, substitute
+
+# Configure matplotlib for LaTeX rendering. The fontset is set by config
+matplotlib.use("Agg")  # Use non-interactive backend
+rcParams["text.usetex"] = False
+rcParams["text.latex.preamble"] = r"\usepackage{amsmath,amssymb,amsfonts}"
+
+_cache = None
+_asset_store = None
+
+# Expressions already rendered in this process, e.g. by a pool of workers
+_prerendered = {}
+
+
+def get_cache():
+    """Return the process-wide SVG cache, opening it on first use."""
+    global _cache
+    if _cache is None:
+        _cache = open_cache()
+    return _cache
+
+
+def get_asset_store():
+    """Return the process-wide asset store, opening it on first use."""
+    global _asset_store
+    if _asset_store is None:
+        _asset_store = open_asset_store()
+    return _asset_store
+
+
+def _new_figure():
+    """Return a figure with a single, empty text artist to draw on."""
+    fig = plt.figure(figsize=(0.1, 0.3), dpi=100, frameon=False)
+
+    # Eliminate all margins
+    plt.subplots_adjust(0, 0, 1, 1)
+    ax = fig.add_subplot(111)
+    ax.axis("off")
+
+    # For equations, ensure proper math formatting
+    text = ax.text(
+        0.5,
+        0.5,
+        "",
+        size=config.FONTSIZE,
+        ha="center",
+        va="center",
+        transform=ax.transAxes,
+    )
+    return fig, text
+
+
+def _save_svg(fig):
+    # Tightest possible bbox with minimal padding. Leave out the date so the
+    # same expression always renders to the same bytes
+    buffer = BytesIO()
+    fig.savefig(
+        buffer,
+        format="svg",
+        bbox_inches="tight",
+        pad_inches=0.01,
+        transparent=True,
+        metadata={"Date": None},
+    )
+    return buffer.getvalue()
+
+
+def render_svg(latex_str):
+    """
+    Render a LaTeX string to SVG bytes using a matplotlib figure.
+
+    Args:
+        latex_str: The LaTeX string to render
+
+    Returns:
+        The SVG document as bytes
+    """
+    fig, text = _new_figure()
+    try:
+        text.set_text(f"${latex_str}$")
+        return _save_svg(fig)
+    finally:
+        plt.close(fig)
+
+
+def render_svg_batch(latex_strs):
+    """
+    Render several LaTeX strings with the figure renderer, drawing each one in
+    turn on the same figure. Creating and closing the figure is about half
+    the cost of rendering an expression, and the output is byte-for-byte the
+    same as render_svg's.
+
+    Returns:
+        A list with the SVG bytes for each string, or the exception raised
+        if it couldn't be rendered
+    """
+    fig, text = _new_figure()
+    results = []
+    try:
+        for latex_str in latex_strs:
+            start = time.perf_counter()
+            text.set_text(f"${latex_str}$")
+            try:
+                results.append(_save_svg(fig))
+            except Exception as e:
+                results.append(e)
+            timing.record_expression(latex_str, time.perf_counter() - start)
+    finally:
+        plt.close(fig)
+    return results
+
+
+def _render_each(render):
+    def render_batch(latex_strs):
+        results = []
+        for latex_str in latex_strs:
+            start = time.perf_counter()
+            try:
+                results.append(render(latex_str))
+            except Exception as e:
+                results.append(e)
+            timing.record_expression(latex_str, time.perf_counter() - start)
+        return results
+
+    return render_batch
+
+
+def _render_mathtext(latex_str):
+    return mathtext_svg.render_svg(latex_str, config.FONTSIZE)
+
+
+RENDERERS = {
+    "figure": render_svg,
+    "mathtext": _render_mathtext,
+}
+
+# The mathtext renderer has no per-call setup to share, so it renders a
+# batch one expression at a time
+BATCH_RENDERERS = {
+    "figure": render_svg_batch,
+    "mathtext": _render_each(_render_mathtext),
+}
+
+
+def forget_prerendered():
+    """Drop the expressions held in memory by prerender_latex."""
+    _prerendered.clear()
+
+
+def close_cache():
+    """
+    Close the process-wide SVG cache, which is reopened on next use. Call
+    this before forking, so the processes don't share its connection.
+    """
+    global _cache
+    if _cache is not None:
+        _cache.close()
+    _cache = None
+
+
+def _cache_key(cache, latex_str):
+    return cache.key(
+        latex_str,
+        fontset=config.FONTSET,
+        fontsize=config.FONTSIZE,
+        renderer=config.RENDERER,
+        matplotlib=matplotlib.__version__,
+    )
+
+
+def _to_base64(svg):
+    svg_base64 = base64.b64encode(svg).decode("utf-8")
+    return f"data:image/svg+xml;base64,{svg_base64}"
+
+
+def _to_src(svg):
+    if config.SVG_PRECISION is not None or config.OUTPUT == "svg":
+        svg = compact_svg(svg, config.SVG_PRECISION)
+    if config.OUTPUT == "svg":
+        return svg.decode("utf8")
+    if config.OUTPUT == "asset":
+        return get_asset_store().url(get_asset_store().put(svg))
+    return _to_base64(svg)
+
+
+def cached_src(latex_str):
+    """
+    Return the image source for a LaTeX string if it has already been
+    rendered, either in this process or in the cache, and None otherwise.
+    """
+    if latex_str in _prerendered:
+        return _prerendered[latex_str]
+    cache = get_cache()
+    if cache is None:
+        return None
+    svg = cache.get(_cache_key(cache, latex_str))
+    return None if svg is None else _to_src(svg)
+
+
+def latex_to_svg(latex_str):
+    """
+    Convert a LaTeX string to SVG bytes, reusing a previously rendered SVG
+    from the cache if possible. Returns None if it can't be rendered.
+    """
+    try:
+        cache = get_cache()
+        svg = None
+        if cache is not None:
+            key = _cache_key(cache, latex_str)
+            svg = cache.get(key)
+        if svg is None:
+            start = time.perf_counter()
+            svg = RENDERERS[config.RENDERER](latex_str)
+            timing.record_expression(latex_str, time.perf_counter() - start)
+            if cache is not None:
+                cache.put(key, svg)
+        return svg
+    except Exception as e:
+        print(f"Error rendering LaTeX: {latex_str} - {str(e)}")
+        return None
+
+
+def latex_to_svg_base64(latex_str):
+    """
+    Convert a LaTeX string to an SVG and return as base64-encoded
+    string using matplotlib.
+
+    Args:
+        latex_str: The LaTeX string to render
+
+    Returns:
+        Base64 encoded SVG image
+    """
+    svg = latex_to_svg(latex_str)
+    return None if svg is None else _to_base64(svg)
+
+
+def latex_to_src(latex_str):
+    """
+    Return the `src` for the image of a LaTeX string: a base64 data URI, the
+    URL of a file in the asset store when config.OUTPUT is "asset", or the
+    SVG markup itself when it's "svg".
+    """
+    if latex_str in _prerendered:
+        return _prerendered[latex_str]
+    svg = latex_to_svg(latex_str)
+    return None if svg is None else _to_src(svg)
+
+
+def latex_to_svgs(latex_strs, check_cache=True):
+    """
+    Convert several LaTeX strings to SVG bytes at once. The ones missing from
+    the cache are rendered as a single batch. Returns a dict mapping each
+    string to its SVG, or to None if it can't be rendered.
+
+    Callers that already know the strings aren't cached can pass
+    check_cache=False to skip looking them up again; the results are still
+    stored in the cache.
+    """
+    cache = get_cache()
+    svgs = {}
+    missing = []
+    for latex_str in dict.fromkeys(latex_strs):
+        svg = None
+        if cache is not None and check_cache:
+            svg = cache.get(_cache_key(cache, latex_str))
+        if svg is None:
+            missing.append(latex_str)
+        svgs[latex_str] = svg
+
+    if missing:
+        results = BATCH_RENDERERS[config.RENDERER](missing)
+        for latex_str, result in zip(missing, results):
+            if isinstance(result, Exception):
+                print(f"Error rendering LaTeX: {latex_str} - {str(result)}")
+                continue
+            svgs[latex_str] = result
+            if cache is not None:
+                cache.put(_cache_key(cache, latex_str), result)
+    return svgs
+
+
+def latex_to_srcs(latex_strs, check_cache=True):
+    """
+    Batch version of latex_to_src, returning a dict of the sources. See
+    latex_to_svgs for `check_cache`.
+    """
+    srcs = {}
+    to_render = []
+    for latex_str in latex_strs:
+        if latex_str in _prerendered:
+            srcs[latex_str] = _prerendered[latex_str]
+        else:
+            to_render.append(latex_str)
+    for latex_str, svg in latex_to_svgs(to_render, check_cache).items():
+        srcs[latex_str] = None if svg is None else _to_src(svg)
+    return srcs
+
+
+def _img_tag(src, latex_str, source):
+    if src and config.OUTPUT == "svg":
+        # src is the SVG markup
+        label = html.escape(latex_str)
+        attributes = f'class="latex-inline" role="img" aria-label="{label}"'
+        return src.replace("<svg ", f"<svg {attributes} ", 1)
+    if src:
+        alt = html.escape(latex_str)
+        return f'<img class="latex-inline" src="{src}" alt="{alt}" />'
+    return source
+
+
+def _math_span(latex_str, source=None):
+    return f'<span class="latex-math">{html.escape(latex_str)}</span>'
+
+
+def process_latex_in_text(text):
+    """
+    Find LaTeX expressions in text and replace with SVG images.
+    Supports both types of syntax for inline equations.
+    """
+    if config.OUTPUT == "katex":
+        return substitute(text, _math_span)
+    return substitute(
+        text,
+        lambda latex_str, source: _img_tag(latex_to_src(latex_str), latex_str, source),
+    )
+
+
+def process_latex_in_texts(texts):
+    """
+    Batch version of process_latex_in_text: the expressions in all of the
+    texts are rendered together, then replaced in each text.
+    """
+    if config.OUTPUT == "katex":
+        # Typeset in the browser: just mark the expressions up
+        return [substitute(text, _math_span) for text in texts]
+    expressions = [latex_str for text in texts for latex_str in find_latex(text)]
+    srcs = latex_to_srcs(expressions)
+    return [
+        substitute(
+            text,
+            lambda latex_str, source: _img_tag(srcs[latex_str], latex_str, source),
+        )
+        for text in texts
+    ]
@@ -0,0 +1,123 @@
+"""
+Render LaTeX to SVG with matplotlib's mathtext layout engine directly.
+
+This skips the figure, axes, tight-bbox and SVG backend machinery used by
+`latex.render_svg` and writes a minimal SVG with the glyph outlines as a
+single path. The box is sized and the expression positioned the same way
+the figure renderer does it, so the two are interchangeable in the HTML.
+"""
+import numpy as np
+from matplotlib.font_manager import FontProperties, findfont, get_font
+from matplotlib.path import Path
+from matplotlib.textpath import text_to_path
+
+# Size of the figure used by the figure renderer, in points. The tight bbox
+# never shrinks below it, so short expressions keep the same box here.
+MIN_WIDTH = 7.2
+MIN_HEIGHT = 21.6
+PAD = 0.72  # pad_inches=0.01
+
+
+def _fmt(value, precision):
+    text = f"{value:.{precision}f}".rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+def _min_extent(prop):
+    """
+    Minimum ascent and descent that matplotlib's text layout reserves for a
+    line in the default font, taken from the font tables where available.
+    """
+    font = get_font(findfont(prop))
+    for table_name, ascent_key, descent_key in [
+        ("OS/2", "sTypoAscender", "sTypoDescender"),
+        ("hhea", "ascent", "descent"),
+    ]:
+        table = font.get_sfnt_table(table_name)
+        if table is None:
+            continue
+        scale = prop.get_size_in_points() / font.get_sfnt_table("head")["unitsPerEm"]
+        return table[ascent_key] * scale, -table[descent_key] * scale
+
+    _, height, descent = text_to_path.get_text_width_height_descent(
+        "lp", prop, ismath=False
+    )
+    return height - descent, descent
+
+
+def path_data(vertices, codes, precision=2):
+    """Convert path vertices and codes into an SVG path `d` attribute."""
+    commands = []
+    i = 0
+    while i < len(codes):
+        code = codes[i]
+        if code == Path.MOVETO:
+            command, n = "M", 1
+        elif code == Path.LINETO:
+            command, n = "L", 1
+        elif code == Path.CURVE3:
+            command, n = "Q", 2
+        elif code == Path.CURVE4:
+            command, n = "C", 3
+        elif code == Path.CLOSEPOLY:
+            commands.append("z")
+            i += 1
+            continue
+        else:
+            i += 1
+            continue
+        points = vertices[i : i + n]
+        coords = " ".join(
+            f"{_fmt(x, precision)} {_fmt(y, precision)}" for x, y in points
+        )
+        commands.append(f"{command}{coords}")
+        i += n
+    return "".join(commands)
+
+
+def render_svg(latex_str, fontsize=14, precision=2):
+    """
+    Render a LaTeX string to SVG bytes using the mathtext parser only.
+
+    Args:
+        latex_str: The LaTeX string to render
+        fontsize: Font size in points
+        precision: Number of decimals kept in path coordinates
+
+    Returns:
+        The SVG document as bytes
+    """
+    math = f"${latex_str}$"
+    prop = FontProperties(size=fontsize)
+    # Both calls share text_to_path's parser, so the expression is only parsed
+    # once; glyph paths come back in units of FONT_SCALE
+    width, height, descent = text_to_path.get_text_width_height_descent(
+        math, prop, ismath=True
+    )
+    vertices, codes = text_to_path.get_text_path(prop, math, ismath=True)
+    vertices = np.array(vertices, dtype=float).reshape(-1, 2)
+    vertices *= fontsize / text_to_path.FONT_SCALE
+
+    min_ascent, min_descent = _min_extent(prop)
+    ascent = max(height - descent, min_ascent)
+    descent = max(descent, min_descent)
+
+    # Center the text box in the (minimum) box, as ha/va="center" does, and
+    # flip the y-axis since SVG coordinates grow downwards
+    box_width = max(width, MIN_WIDTH)
+    box_height = max(ascent + descent, MIN_HEIGHT)
+    x_offset = PAD + (box_width - width) / 2
+    y_offset = PAD + box_height / 2 + (ascent - descent) / 2
+    vertices[:, 0] = vertices[:, 0] + x_offset
+    vertices[:, 1] = y_offset - vertices[:, 1]
+
+    svg_width = _fmt(box_width + 2 * PAD, 2)
+    svg_height = _fmt(box_height + 2 * PAD, 2)
+    d = path_data(vertices, codes, precision)
+    svg = (
+        '<svg xmlns="http://www.w3.org/2000/svg" '
+        f'width="{svg_width}pt" height="{svg_height}pt" '
+        f'viewBox="0 0 {svg_width} {svg_height}">'
+        f'<path d="{d}"/></svg>'
+    )
+    return svg.encode("utf-8")
@@ -0,0 +1,177 @@
+"""
+Live progress and throughput metrics for a running recipe.
+
+The recipes count the tasks their stream hands out, the answers Prodigy
+passes to their `update` callback and the time spent rendering each task,
+and serve the numbers in the Prometheus text format at /metrics.
+"""
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+
+from .latex import get_cache
+
+METRICS_ROUTE = "/metrics"
+
+# Only the most recent observations are kept for the medians
+WINDOW = 1000
+
+
+def _escape(value):
+    """Escape a label value as the Prometheus text format requires."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    # Session IDs come from the annotators' URLs, so they can contain anything
+    pairs = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+    return f"{{{pairs}}}"
+
+
+def _quantile(values, q):
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+class Metrics:
+    def __init__(self, recipe, dataset, n_tasks=0):
+        self.recipe = recipe
+        self.dataset = dataset
+        self.n_tasks = n_tasks
+        self.served = 0
+        self.answered = Counter()
+        self.task_seconds = defaultdict(lambda: deque(maxlen=WINDOW))
+        self.render_seconds = deque(maxlen=WINDOW)
+        self.render_total = 0.0
+        self.render_count = 0
+        self._last_timestamp = {}
+        # Prodigy calls update() and serves requests from different threads
+        self._lock = threading.Lock()
+
+    @property
+    def queued(self):
+        return max(self.n_tasks - self.served, 0)
+
+    def serve(self, stream):
+        """
+        Pass the stream's tasks through, counting the ones handed out. Unlike
+        a generator, this keeps reading the stream after it runs out, so a
+        stream that starts again (like the overlap router's) still can.
+        """
+        return map(self._count_served, stream)
+
+    def _count_served(self, eg):
+        with self._lock:
+            self.served += 1
+        return eg
+
+    @contextmanager
+    def rendering(self, n_tasks):
+        """
+        Record the time spent rendering a batch of `n_tasks` tasks, as the
+        average time per task. LaTeX is rendered for a whole batch at once,
+        so individual tasks can't be timed separately.
+        """
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        if not n_tasks:
+            return
+        with self._lock:
+            self.render_seconds.extend([elapsed / n_tasks] * min(n_tasks, WINDOW))
+            self.render_total += elapsed
+            self.render_count += n_tasks
+
+    def update(self, answers):
+        """Prodigy `update` callback: count answers and time between them."""
+        with self._lock:
+            for eg in sorted(answers, key=lambda eg: eg.get("_timestamp", 0)):
+                session = eg.get("_session_id") or eg.get("_annotator_id", "")
+                self.answered[session] += 1
+                timestamp = eg.get("_timestamp")
+                if timestamp is None:
+                    continue
+                last = self._last_timestamp.get(session)
+                if last is not None and timestamp >= last:
+                    self.task_seconds[session].append(timestamp - last)
+                self._last_timestamp[session] = timestamp
+
+    def render_prometheus(self):
+        """The current metrics in the Prometheus text exposition format."""
+        with self._lock:
+            base = {"recipe": self.recipe, "dataset": self.dataset}
+            lines = [
+                "# HELP ume_tasks_total Tasks in the stream",
+                "# TYPE ume_tasks_total gauge",
+                f"ume_tasks_total{_labels(**base)} {self.n_tasks}",
+                "# HELP ume_tasks_served_total Tasks handed out by the stream",
+                "# TYPE ume_tasks_served_total counter",
+                f"ume_tasks_served_total{_labels(**base)} {self.served}",
+                "# HELP ume_tasks_queued Tasks left in the stream",
+                "# TYPE ume_tasks_queued gauge",
+                f"ume_tasks_queued{_labels(**base)} {self.queued}",
+                "# HELP ume_tasks_answered_total Answers received per session",
+                "# TYPE ume_tasks_answered_total counter",
+            ]
+            for session, count in sorted(self.answered.items()):
+                labels = _labels(**base, session=session)
+                lines.append(f"ume_tasks_answered_total{labels} {count}")
+
+            lines += [
+                "# HELP ume_task_seconds Median time between answers per session",
+                "# TYPE ume_task_seconds gauge",
+            ]
+            for session, deltas in sorted(self.task_seconds.items()):
+                if deltas:
+                    labels = _labels(**base, session=session)
+                    median = statistics.median(deltas)
+                    lines.append(f"ume_task_seconds{labels} {median:g}")
+
+            lines += [
+                "# HELP ume_render_seconds Time to render a task, averaged per batch",
+                "# TYPE ume_render_seconds summary",
+            ]
+            if self.render_seconds:
+                for q in [0.5, 0.9, 0.99]:
+                    labels = _labels(**base, quantile=q)
+                    value = _quantile(self.render_seconds, q)
+                    lines.append(f"ume_render_seconds{labels} {value:.6f}")
+            lines += [
+                f"ume_render_seconds_sum{_labels(**base)} {self.render_total:.6f}",
+                f"ume_render_seconds_count{_labels(**base)} {self.render_count}",
+            ]
+
+        cache = get_cache()
+        if cache is not None:
+            lookups = cache.hits + cache.misses
+            hit_ratio = cache.hits / lookups if lookups else 0.0
+            lines += [
+                "# HELP ume_render_cache_hit_ratio SVG cache hits per lookup",
+                "# TYPE ume_render_cache_hit_ratio gauge",
+                f"ume_render_cache_hit_ratio{_labels(**base)} {hit_ratio:.4f}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+def mount_metrics(metrics):
+    """Serve the metrics from Prodigy's web app at /metrics."""
+    from prodigy.app import app
+    from starlette.responses import PlainTextResponse
+    from starlette.routing import Route
+
+    def endpoint(request):
+        return PlainTextResponse(
+            metrics.render_prometheus(),
+            media_type="text/plain; version=0.0.4",
+        )
+
+    # Replace the route of an earlier recipe run in the same process
+    app.router.routes[:] = [
+        route
+        for route in app.router.routes
+        if getattr(route, "path", None) != METRICS_ROUTE
+    ]
+    # Put the route first so none of Prodigy's own routes can shadow it
+    app.router.routes.insert(0, Route(METRICS_ROUTE, endpoint, methods=["GET"]))
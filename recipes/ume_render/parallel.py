@@ -0,0 +1,106 @@
+"""
+Pre-render the LaTeX in a batch of texts, optionally across a pool of
+processes.
+
+The distinct expressions are rendered in batches (see
+latex.render_svg_batch) and the results are stored in this process, so the
+recipes' usual serial pass over the stream finds every expression already
+rendered. The order of the stream, and the output for each item, is the
+same as without the pool.
+"""
+import atexit
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from . import config, latex, timing
+from .tokenizer import find_latex
+
+
+def _init_worker(settings):
+    # Importing latex switched the worker to the Agg backend; use the same
+    # settings as the parent so cache keys and output match
+    config.configure(**settings)
+
+
+def _render_batch(latex_strs):
+    # The parent has already looked these up in the cache
+    return latex.latex_to_srcs(latex_strs, check_cache=False)
+
+
+_pool = None
+_pool_workers = 0
+
+
+def get_pool(workers):
+    """Return a pool of `workers` processes, starting it if needed."""
+    global _pool, _pool_workers
+    if _pool is not None and _pool_workers != workers:
+        shutdown_pool()
+    if _pool is None:
+        # Spawn fresh workers rather than forking, so they don't share this
+        # process's SQLite connection or pyplot state
+        _pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(config.settings(),),
+        )
+        _pool_workers = workers
+    return _pool
+
+
+@atexit.register
+def shutdown_pool():
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown()
+    _pool = None
+    _pool_workers = 0
+
+
+def prerender_latex(texts, workers, keep_pool=False):
+    """
+    Render every distinct LaTeX expression in `texts` that isn't cached yet,
+    as one batch in this process or split into batches across `workers`
+    processes. Returns the number of expressions rendered.
+
+    The pool is shut down afterwards unless `keep_pool` is set, which saves
+    starting new workers when this is called for one batch at a time.
+    """
+    with timing.stage("prerender_latex"):
+        return _prerender_latex(texts, workers, keep_pool)
+
+
+def _prerender_latex(texts, workers, keep_pool):
+    if config.OUTPUT == "katex":
+        # The browser typesets the expressions, there's nothing to render
+        return 0
+    expressions = set()
+    for text in texts:
+        expressions.update(find_latex(text))
+
+    # Only render the expressions that aren't in the cache
+    missing = []
+    for latex_str in sorted(expressions):
+        src = latex.cached_src(latex_str)
+        if src is None:
+            missing.append(latex_str)
+        else:
+            latex._prerendered[latex_str] = src
+    if not missing:
+        return 0
+    if workers <= 1:
+        # Already looked up in the cache above, so don't count them twice
+        latex._prerendered.update(latex.latex_to_srcs(missing, check_cache=False))
+        return len(missing)
+
+    size = max(1, len(missing) // (workers * 4))
+    batches = [missing[i : i + size] for i in range(0, len(missing), size)]
+    try:
+        pool = get_pool(workers)
+        for srcs in pool.map(_render_batch, batches):
+            latex._prerendered.update(srcs)
+    finally:
+        if not keep_pool:
+            shutdown_pool()
+    return len(missing)
@@ -0,0 +1,158 @@
+"""
+Route select-suggest tasks so every item gets ratings from a target number
+of different annotators, without re-deploying between rounds.
+
+OverlapRouter keeps, in memory, the sessions that have answered and
+completed each item (seeded from the dataset at startup and kept up to date
+by the recipe's `update` callback) and the sessions each item has been sent
+to. Its stream offers the items closest to the target first, and its task
+router sends an item to the session asking for work, plus any other sessions
+needed to reach the target, skipping sessions that have already answered or
+been sent it. An item is retired once it has the target number of complete
+ratings.
+"""
+import threading
+import time
+from collections import defaultdict
+
+SCORE_FIELDS = ["overall", "topic", "vocabulary", "choices"]
+VALID_SCORES = ["1", "2", "3"]
+
+# An item sent to a session that hasn't rated it after this many seconds
+# can be sent to someone else instead
+ASSIGNMENT_TIMEOUT = 60 * 60
+
+
+def session_of(eg):
+    return eg.get("_session_id") or eg.get("_annotator_id", "")
+
+
+def is_complete(eg):
+    """Whether an answer is an accepted rating with every score filled in."""
+    return eg.get("answer", "accept") == "accept" and all(
+        str(eg.get(field)) in VALID_SCORES for field in SCORE_FIELDS
+    )
+
+
+class OverlapRouter:
+    def __init__(self, tasks, target=2, timeout=ASSIGNMENT_TIMEOUT):
+        self.tasks = {task["idx"]: task for task in tasks}
+        self.target = target
+        self.timeout = timeout
+        self.answered = defaultdict(set)  # idx -> sessions with any answer
+        self.completed = defaultdict(set)  # idx -> sessions with a complete rating
+        self.assigned = defaultdict(dict)  # idx -> {session: time sent}
+        self._routed = 0
+        # Prodigy calls update() and the router from different threads
+        self._lock = threading.Lock()
+
+    def seed(self, examples):
+        """Record the answers already in the dataset."""
+        self.update(examples)
+
+    def update(self, answers):
+        """Prodigy `update` callback: record who answered and completed what."""
+        with self._lock:
+            for eg in answers:
+                idx = eg.get("idx")
+                if idx not in self.tasks:
+                    continue
+                session = session_of(eg)
+                self.answered[idx].add(session)
+                self.assigned[idx].pop(session, None)
+                if is_complete(eg):
+                    self.completed[idx].add(session)
+
+    @property
+    def retired(self):
+        return sum(len(self.completed[idx]) >= self.target for idx in self.tasks)
+
+    def _pending(self, idx, now):
+        return [
+            session
+            for session, sent in self.assigned[idx].items()
+            if now - sent < self.timeout
+        ]
+
+    def _open_slots(self, idx, now):
+        return self.target - len(self.completed[idx]) - len(self._pending(idx, now))
+
+    def stream(self, prepare=None):
+        """
+        Return the stream of items that still need ratings, the ones closest
+        to the target first. See OverlapStream.
+        """
+        return OverlapStream(self, prepare)
+
+    def route(self, ctrl, session_id, item):
+        """
+        Prodigy task router: the sessions to send `item` to, starting with
+        the one asking for work.
+        """
+        idx = item["idx"]
+        now = time.time()
+        with self._lock:
+            slots = self._open_slots(idx, now)
+            taken = self.answered[idx] | set(self._pending(idx, now))
+            sessions = [session_id, *getattr(ctrl, "all_session_ids", [])]
+            chosen = []
+            for session in dict.fromkeys(sessions):
+                if len(chosen) >= slots:
+                    break
+                if session not in taken:
+                    chosen.append(session)
+                    self.assigned[idx][session] = now
+            self._routed += len(chosen)
+        return chosen
+
+
+class OverlapStream:
+    """
+    The router's stream. Each pass offers every item with open slots once.
+    A pass in which the router placed nothing ends the stream for now, so
+    Prodigy's request returns with what it has, or "no tasks available",
+    instead of waiting. Unlike a generator, the stream can be read again
+    after it ends: the next request starts a fresh pass, so sessions that
+    join later and expired assignments are still served.
+    `prepare` is called on an item the first time it's offered.
+    """
+
+    def __init__(self, router, prepare=None):
+        self.router = router
+        self.prepare = prepare
+        self._prepared = set()
+        self._order = {idx: i for i, idx in enumerate(router.tasks)}
+        self._pass = iter(())
+        self._routed_before = None
+
+    def __iter__(self):
+        return self
+
+    def _candidates(self):
+        router = self.router
+        now = time.time()
+        with router._lock:
+            return sorted(
+                (idx for idx in router.tasks if router._open_slots(idx, now) > 0),
+                key=lambda idx: (-len(router.completed[idx]), self._order[idx]),
+            )
+
+    def __next__(self):
+        for idx in self._pass:
+            if self.prepare is not None and idx not in self._prepared:
+                self.router.tasks[idx] = self.prepare(self.router.tasks[idx])
+                self._prepared.add(idx)
+            # Prodigy may add to the task it's given, so hand out copies
+            return dict(self.router.tasks[idx])
+        # Start another pass straight away only if this one placed something
+        routed = self._routed_before is None or (
+            self.router._routed > self._routed_before
+        )
+        self._routed_before = self.router._routed
+        candidates = self._candidates() if routed else []
+        self._pass = iter(candidates)
+        if not candidates:
+            # The next read starts a fresh pass
+            self._routed_before = None
+            raise StopIteration
+        return next(self)
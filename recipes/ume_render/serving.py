@@ -0,0 +1,90 @@
+"""
+Stream setup shared by the recipes: task hashing, the database connection,
+the startup report and serving rendered assets. Unlike the rest of the
+package this needs Prodigy.
+"""
+from prodigy import set_hashes
+
+from . import config, timing
+from .assets import mount_assets
+from .journal import JournaledDatabase
+from .latex import get_asset_store, get_cache
+
+# Tasks are deduplicated on the item ID alone
+INPUT_KEYS = ["idx"]
+
+
+def hash_task(eg):
+    with timing.stage("hash"):
+        return set_hashes(eg, input_keys=INPUT_KEYS)
+
+
+def input_hash(item):
+    """The input hash of an item, computed from its idx if it isn't hashed yet."""
+    if "_input_hash" in item:
+        return item["_input_hash"]
+    return hash_task({key: item[key] for key in INPUT_KEYS})["_input_hash"]
+
+
+def connect_db(journal_path=None):
+    """
+    Prodigy's database, behind a JournaledDatabase if `journal_path` is given
+    so answers are saved to it in the background.
+    """
+    from prodigy.components.db import connect
+
+    db = connect()
+    if journal_path is None:
+        return db
+    db = JournaledDatabase(db, journal_path)
+    if db.pending:
+        print(f"Answer journal: saving {db.pending} answers from the last run")
+    return db
+
+
+def answered_input_hashes(dataset, db=None):
+    """
+    The input hashes of the examples already saved to `dataset`. Only the
+    hashes are fetched, not the examples themselves.
+    """
+    db = connect_db() if db is None else db
+    if dataset not in db:
+        return set()
+    with timing.stage("answered_hashes"):
+        return set(db.get_input_hashes(dataset))
+
+
+def skip_answered(items, answered):
+    """
+    Yield the items whose input hash isn't in `answered`, so the ones Prodigy
+    would skip anyway are never rendered.
+    """
+    for item in items:
+        if input_hash(item) not in answered:
+            yield item
+
+
+def report_stream(n_tasks, n_input_hashes):
+    """
+    Print the stream size, the SVG cache's hit/miss counts and, if enabled,
+    the startup timings.
+    """
+    print("Length of stream: ", n_tasks)
+    print("Unique input hashes in stream: ", n_input_hashes)
+    if get_cache() is not None:
+        print("LaTeX SVG cache: ", get_cache().stats())
+    timing.report()
+
+
+def serve_assets():
+    """Serve the rendered SVGs from Prodigy's web app if tasks link to them."""
+    if config.OUTPUT == "asset":
+        mount_assets(get_asset_store())
+
+
+def load_answers(dataset, db=None):
+    """The examples already saved to `dataset`, if it exists."""
+    db = connect_db() if db is None else db
+    if dataset not in db:
+        return []
+    return db.get_dataset_examples(dataset)
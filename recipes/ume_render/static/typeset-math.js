@@ -0,0 +1,89 @@
+// Typesets the <span class="latex-math"> elements that ume_render emits with
+// LATEX_OUTPUT=katex, using the vendored KaTeX build loaded before this
+// script. Elements with a data-field attribute show the task's current value
+// of that field, so they're rebuilt as the annotator edits it, unless they're
+// inside a data-original element (the original side of an adjudication).
+(function () {
+    // The same rules as ume_render/tokenizer.py
+    var TOKEN_PATTERN = /(\\\$)|\$((?:\\\$|[^$])+?)\$|\\\((.+?)\\\)|(\\n)/g;
+    var SHORTHAND_PATTERN = /\\(le|ge)(?![A-Za-z])/g;
+    var MATH_NEWLINE_PATTERN = /\\n(?![A-Za-z])/;
+    var NESTED_PATTERN = /^\s*(?:\$([\s\S]+)\$|\\\(([\s\S]+)\\\))\s*$/;
+
+    // MathML for each expression seen so far, so edits only typeset the
+    // expressions that changed
+    var typeset = new Map();
+
+    function escapeHtml(text) {
+        var span = document.createElement("span");
+        span.textContent = text;
+        return span.innerHTML;
+    }
+
+    function normalizeLatex(latex) {
+        var nested = NESTED_PATTERN.exec(latex);
+        if (nested) {
+            latex = nested[1] || nested[2];
+        }
+        return latex.replace(SHORTHAND_PATTERN, "\\$1q");
+    }
+
+    function mathSpan(latex) {
+        return '<span class="latex-math">' + escapeHtml(normalizeLatex(latex)) + "</span>";
+    }
+
+    function toHtml(text) {
+        // Text is inserted as HTML, like the server-side display fields
+        return text.replace(TOKEN_PATTERN, function (match, dollar, math, paren, newline) {
+            if (dollar) {
+                return "$";
+            }
+            if (newline) {
+                return "<br>";
+            }
+            return (math || paren).split(MATH_NEWLINE_PATTERN).map(mathSpan).join("<br>");
+        });
+    }
+
+    function typesetMath(root) {
+        var spans = root.querySelectorAll("span.latex-math:not([data-typeset])");
+        spans.forEach(function (span) {
+            var latex = span.textContent;
+            if (!typeset.has(latex)) {
+                typeset.set(
+                    latex,
+                    katex.renderToString(latex, {
+                        output: "mathml",
+                        throwOnError: false,
+                        strict: "ignore",
+                    })
+                );
+            }
+            span.innerHTML = typeset.get(latex);
+            span.setAttribute("data-typeset", "");
+            span.setAttribute("title", latex);
+        });
+    }
+
+    function updateFields() {
+        var content = (window.prodigy && window.prodigy.content) || {};
+        document.querySelectorAll("[data-field]").forEach(function (element) {
+            if (element.closest("[data-original]")) {
+                return;
+            }
+            var text = content[element.getAttribute("data-field")];
+            if (typeof text === "string" && element.getAttribute("data-source") !== text) {
+                element.innerHTML = toHtml(text);
+                element.setAttribute("data-source", text);
+            }
+        });
+        typesetMath(document);
+    }
+
+    document.addEventListener("prodigymount", updateFields);
+    document.addEventListener("prodigyupdate", updateFields);
+    // New tasks replace the HTML block without an update event
+    new MutationObserver(function () {
+        typesetMath(document);
+    }).observe(document.body, { childList: true, subtree: true });
+})();
@@ -0,0 +1,144 @@
+"""
+Build the rendered task dicts served by the recipes.
+
+These live here rather than in the recipe files so that
+scripts/compile-tasks.py can produce exactly the same tasks offline.
+"""
+import random
+from itertools import islice
+
+from . import timing
+# The recipes also import the field names from here
+from .fields import (  # noqa: F401
+    ADJUDICATION_RENDER_FIELDS,
+    RATING_RENDER_FIELDS,
+    TEXT_KEYS,
+)
+from .latex import process_latex_in_texts
+
+
+def render_rating_task(item, mcq_template):
+    """Add the display fields and HTML used by the select-suggest recipe."""
+    # Store the original revision text to allow resetting
+    item["question_orig"] = item["question"]
+    item["choice_A_orig"] = item["choice_A"]
+    item["choice_B_orig"] = item["choice_B"]
+    item["choice_C_orig"] = item["choice_C"]
+    item["choice_D_orig"] = item["choice_D"]
+
+    with timing.stage("render_task", item_id=item.get("idx")):
+        # Render all of the item's expressions in one batch
+        with timing.stage("latex"):
+            displays = process_latex_in_texts([item[key] for key in TEXT_KEYS])
+        for key, display in zip(TEXT_KEYS, displays):
+            item[f"display_{key}"] = display
+        with timing.stage("template"):
+            item["html"] = mcq_template.render(item)
+    return item
+
+
+# The original and revised versions of each field in an adjudication item.
+# The adjudicator edits the field itself, so the revision they were shown is
+# kept in `{key}_rev`
+SUFFIXES = ["_orig", "_rev"]
+
+
+def render_items(d, ab=None):
+    keys = TEXT_KEYS
+    modified = []  # List of items that differ between versions
+    if ab is None:
+        ab = ["a", "b"]
+        random.shuffle(ab)
+    # Remember which side showed the original, since the rendered fields
+    # are dropped before saving
+    d["orig_side"] = ab[0]
+    for key in keys:
+        d.setdefault(f"{key}_rev", d[key])
+
+    # Most fields are unchanged, so only render each distinct text once, and
+    # render all of them in one batch. The expressions a changed field has in
+    # common with its original are only rendered once too, so only the ones
+    # that were actually edited are new.
+    texts = dict.fromkeys(d[f"{key}{suffix}"] for key in keys for suffix in SUFFIXES)
+    with timing.stage("latex"):
+        displays = dict(zip(texts, process_latex_in_texts(list(texts))))
+    for key in keys:
+        d[f"{ab[0]}_{key}"] = displays[d[f"{key}_orig"]]
+        d[f"{ab[1]}_{key}"] = displays[d[f"{key}_rev"]]
+        if d[f"{key}_orig"] != d[f"{key}_rev"]:
+            modified.append(key)
+
+    d["modified"] = modified
+
+    return d
+
+
+def render_adjudication_task(item, mcq_template):
+    """Add the HTML and diff used by the adjudicate recipe."""
+    with timing.stage("render_task", item_id=item.get("idx")):
+        item = render_items(item)
+        with timing.stage("template"):
+            item["html"] = mcq_template.render(item)
+    # The A/B fields are only needed for the HTML, and would double the
+    # size of the task sent to the browser
+    for field in ADJUDICATION_RENDER_FIELDS:
+        if field != "html":
+            del item[field]
+    return item
+
+
+def strip_render_fields(examples, fields):
+    """Remove the render-only fields from examples before they're saved."""
+    for eg in examples:
+        for field in fields:
+            eg.pop(field, None)
+    return examples
+
+
+def rerender_rating_answer(eg, mcq_template):
+    """
+    Rebuild the display fields and HTML of a saved select-suggest answer, as
+    the annotator saw them (from the original text, not their revision).
+    """
+    texts = [eg.get(f"{key}_orig", eg[key]) for key in TEXT_KEYS]
+    for key, display in zip(TEXT_KEYS, process_latex_in_texts(texts)):
+        eg[f"display_{key}"] = display
+    eg["html"] = mcq_template.render(eg)
+    return eg
+
+
+def rerender_adjudication_answer(eg, mcq_template):
+    """
+    Rebuild the A/B fields and HTML of a saved adjudicate answer, as the
+    adjudicator saw them. Answers saved without `{key}_rev` show the saved
+    (adjudicated) text on the revision's side instead.
+    """
+    modified = eg.get("modified")
+    orig_side = eg.get("orig_side", "a")
+    eg = render_items(eg, ab=[orig_side, "b" if orig_side == "a" else "a"])
+    if modified is not None:
+        eg["modified"] = modified
+    eg["html"] = mcq_template.render(eg)
+    return eg
+
+
+def rating_texts(items):
+    """The texts in rating items that contain LaTeX to render."""
+    return [item[key] for item in items for key in TEXT_KEYS]
+
+
+def adjudication_texts(items):
+    """The texts in adjudication items that contain LaTeX to render."""
+    return [
+        item[f"{key}{suffix}"]
+        for item in items
+        for key in TEXT_KEYS
+        for suffix in ["", "_orig"]
+    ]
+
+
+def batched(items, size):
+    """Yield lists of up to `size` items, consuming `items` lazily."""
+    items = iter(items)
+    while batch := list(islice(items, size)):
+        yield batch
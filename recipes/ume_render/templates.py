@@ -0,0 +1,99 @@
+"""
+The recipes' Jinja templates, compiled once per process.
+
+The recipes, scripts/compile-tasks.py and scripts/rerender-annotations.py
+all look templates up here by recipe name, so they always agree on which
+file a recipe's tasks are rendered with. Compiled templates are kept in a
+bytecode cache on disk (JINJA_CACHE_DIR, default .cache/jinja), along with
+the fields each one reads, so a restart doesn't parse or compile them again
+until they change.
+"""
+import hashlib
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+
+import jinja2
+from jinja2 import DebugUndefined, Environment, FileSystemBytecodeCache
+from jinja2 import FileSystemLoader, meta
+
+from . import config
+from .compact import share_glyphs
+
+RECIPES_DIR = Path(__file__).resolve().parents[1]
+
+TEMPLATES = {
+    "select-suggest": RECIPES_DIR / "universal-math-exam" / "mcq.jinja2",
+    "adjudicate": RECIPES_DIR / "universal-math-exam-adjudication" / "mcq.jinja2",
+}
+
+DEFAULT_CACHE_DIR = ".cache/jinja"
+
+
+class TaskTemplate:
+    """A compiled template, and the task fields it uses."""
+
+    def __init__(self, template, fields):
+        self.template = template
+        self.fields = fields
+
+    def render(self, task):
+        # Only pass what the template reads, rather than copying every field
+        # of the task into the template context
+        html = self.template.render(
+            {field: task[field] for field in self.fields if field in task}
+        )
+        # Inlined SVGs share one copy of each glyph per task
+        return share_glyphs(html) if config.OUTPUT == "svg" else html
+
+
+@lru_cache(maxsize=None)
+def get_cache_dir():
+    cache_dir = Path(os.getenv("JINJA_CACHE_DIR", DEFAULT_CACHE_DIR))
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+@lru_cache(maxsize=None)
+def get_environment():
+    return Environment(
+        loader=FileSystemLoader(RECIPES_DIR),
+        undefined=DebugUndefined,
+        bytecode_cache=FileSystemBytecodeCache(str(get_cache_dir())),
+        # The templates don't change while a recipe is running
+        auto_reload=False,
+    )
+
+
+def template_fields(environment, source):
+    """
+    The variables a template reads. Finding them takes parsing the source,
+    so they're cached next to the bytecode under the source's checksum.
+    """
+    key = f"{jinja2.__version__}\n{source}".encode("utf8")
+    path = get_cache_dir() / f"fields-{hashlib.sha256(key).hexdigest()}.json"
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        pass
+    fields = sorted(meta.find_undeclared_variables(environment.parse(source)))
+    # Write then rename, so another process never reads half a file
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(fields))
+    os.replace(tmp_path, path)
+    return fields
+
+
+@lru_cache(maxsize=None)
+def load_template(path):
+    environment = get_environment()
+    name = Path(path).resolve().relative_to(RECIPES_DIR).as_posix()
+    source, _, _ = environment.loader.get_source(environment, name)
+    fields = template_fields(environment, source)
+    return TaskTemplate(environment.get_template(name), fields)
+
+
+def get_template(recipe):
+    """Return the compiled mcq.jinja2 template for a recipe."""
+    return load_template(TEMPLATES[recipe])
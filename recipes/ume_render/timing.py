@@ -0,0 +1,96 @@
+"""
+Opt-in timing of the recipes' startup and rendering hot paths.
+
+Set UME_TIMINGS=1 to record the wall time and call count of each stage
+(loading, LaTeX rendering, templates, hashing), the slowest LaTeX
+expressions and the slowest tasks. A summary is printed once the stream is
+ready, and again at exit. Set UME_PROFILE=<path> to also run cProfile over
+the same period and write the stats to <path>, for `python -m pstats` or
+snakeviz. Expressions rendered in worker processes (--workers) aren't timed.
+"""
+import atexit
+import cProfile
+import heapq
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+PROFILE_PATH = os.getenv("UME_PROFILE")
+ENABLED = bool(os.getenv("UME_TIMINGS") or PROFILE_PATH)
+
+# Number of slowest expressions and tasks to list
+N_SLOWEST = 10
+
+_stages = defaultdict(lambda: [0, 0.0])  # name -> [calls, seconds]
+_slowest_expressions = []  # min-heap of (seconds, latex_str)
+_slowest_items = []  # min-heap of (seconds, item id)
+_profiler = None
+
+
+def _keep_slowest(heap, seconds, value):
+    if len(heap) < N_SLOWEST:
+        heapq.heappush(heap, (seconds, value))
+    elif seconds > heap[0][0]:
+        heapq.heapreplace(heap, (seconds, value))
+
+
+@contextmanager
+def stage(name, item_id=None):
+    """
+    Time the code in the block as part of stage `name`. With `item_id`,
+    also count it towards that task's render time.
+    """
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _stages[name][0] += 1
+        _stages[name][1] += elapsed
+        if item_id is not None:
+            _keep_slowest(_slowest_items, elapsed, str(item_id))
+
+
+def record_expression(latex_str, seconds):
+    """Record the time it took to render one LaTeX expression."""
+    if ENABLED:
+        _stages["render_expression"][0] += 1
+        _stages["render_expression"][1] += seconds
+        _keep_slowest(_slowest_expressions, seconds, latex_str)
+
+
+def report():
+    """Print the timings recorded so far, and write the profile if enabled."""
+    if not ENABLED:
+        return
+    print("\nTimings:")
+    print(f"  {'stage':<20} {'calls':>8} {'total s':>9} {'ms/call':>9}")
+    for name, (calls, seconds) in sorted(
+        _stages.items(), key=lambda entry: -entry[1][1]
+    ):
+        ms_per_call = seconds / calls * 1000
+        print(f"  {name:<20} {calls:>8} {seconds:>9.3f} {ms_per_call:>9.2f}")
+    if _slowest_expressions:
+        print("Slowest LaTeX expressions:")
+        for seconds, latex_str in sorted(_slowest_expressions, reverse=True):
+            print(f"  {seconds * 1000:>8.1f} ms  {latex_str[:70]}")
+    if _slowest_items:
+        print("Slowest tasks:")
+        for seconds, item_id in sorted(_slowest_items, reverse=True):
+            print(f"  {seconds * 1000:>8.1f} ms  {item_id}")
+    if _profiler is not None:
+        _profiler.dump_stats(PROFILE_PATH)
+        print(f"Wrote profile to {PROFILE_PATH}")
+    print()
+
+
+if ENABLED:
+    if PROFILE_PATH:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    # Lazy streams render while the server runs, so report those at exit
+    atexit.register(report)
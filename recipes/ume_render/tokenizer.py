@@ -0,0 +1,124 @@
+"""
+Split item text into plain text and inline LaTeX segments in a single pass.
+
+Recognises `$...$` and `\\(...\\)` math, escaped dollar signs (`\\$`) in
+text, and the literal two-character `\\n` sequences used for line breaks.
+"""
+import re
+
+TEXT = "text"
+MATH = "math"
+
+TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<escaped_dollar>\\\$)                # \$ outside math is a dollar sign
+    | \$(?P<dollar>(?:\\\$|[^$])+?)\$       # $...$, which may contain \$
+    | \\\((?P<paren>.+?)\\\)                # \(...\)
+    | (?P<newline>\\n)                      # literal "\n" in text
+    """,
+    re.VERBOSE,
+)
+
+# mathtext doesn't know the \le and \ge shorthands. Only match the whole
+# command, so \leq, \left, \geq etc. are left alone.
+SHORTHAND_PATTERN = re.compile(r"\\(le|ge)(?![A-Za-z])")
+
+
+# A literal "\n" inside math is a line break unless it starts a command
+# such as \neq or \ne
+MATH_NEWLINE_PATTERN = re.compile(r"\\n(?![A-Za-z])")
+
+# Some items wrap an expression in both kinds of delimiters, e.g. $\(x\)$
+NESTED_PATTERN = re.compile(r"\s*(?:\$(.+)\$|\\\((.+)\\\))\s*", re.DOTALL)
+
+
+def normalize_latex(latex_str):
+    # The substring checks skip the regexes for the common case
+    if "$" in latex_str or "\\(" in latex_str:
+        nested = NESTED_PATTERN.fullmatch(latex_str)
+        if nested:
+            latex_str = nested.group(1) or nested.group(2)
+    if "\\le" in latex_str or "\\ge" in latex_str:
+        latex_str = SHORTHAND_PATTERN.sub(r"\\\1q", latex_str)
+    return latex_str
+
+
+def _math_lines(match):
+    """The normalized expressions, and their sources, in a math match."""
+    latex_str = match.group(match.lastgroup)
+    if "\\n" not in latex_str:
+        return [(normalize_latex(latex_str), match.group(0))]
+    return [
+        (normalize_latex(line), f"${line}$")
+        for line in MATH_NEWLINE_PATTERN.split(latex_str)
+    ]
+
+
+def tokenize(text):
+    """
+    Yield `(kind, value, source)` segments of `text`, where kind is TEXT or
+    MATH. For text, value is the text with escapes resolved and line breaks
+    as `<br>`, and source is None. For math, value is the normalized LaTeX
+    expression and source the original delimited substring.
+    """
+    # Most answer choices are plain text with nothing to tokenize
+    if "$" not in text and "\\" not in text:
+        if text:
+            yield TEXT, text, None
+        return
+
+    position = 0
+    pending = []
+    for match in TOKEN_PATTERN.finditer(text):
+        start, end = match.span()
+        if start > position:
+            pending.append(text[position:start])
+        position = end
+
+        kind = match.lastgroup
+        if kind == "escaped_dollar":
+            pending.append("$")
+        elif kind == "newline":
+            pending.append("<br>")
+        else:
+            if pending:
+                yield TEXT, "".join(pending), None
+                pending = []
+            for i, (latex_str, source) in enumerate(_math_lines(match)):
+                if i > 0:
+                    yield TEXT, "<br>", None
+                yield MATH, latex_str, source
+
+    if position < len(text):
+        pending.append(text[position:])
+    if pending:
+        yield TEXT, "".join(pending), None
+
+
+def find_latex(text):
+    """Return the LaTeX expressions in `text`, in order."""
+    return [value for kind, value, _ in tokenize(text) if kind == MATH]
+
+
+def substitute(text, replace_math):
+    """
+    Return `text` with escapes resolved, line breaks as `<br>` and every
+    expression replaced by `replace_math(latex_str, source)`. Equivalent to
+    joining the segments from tokenize(), but the scan stays in the regex
+    engine, which is what makes it cheaper than the old chain of re.sub and
+    str.replace calls.
+    """
+    if "$" not in text and "\\" not in text:
+        return text
+
+    def replace(match):
+        kind = match.lastgroup
+        if kind == "escaped_dollar":
+            return "$"
+        if kind == "newline":
+            return "<br>"
+        return "<br>".join(
+            replace_math(latex_str, source) for latex_str, source in _math_lines(match)
+        )
+
+    return TOKEN_PATTERN.sub(replace, text)
@@ -1,152 +1,119 @@
-import base64
-import re
-from io import BytesIO
+import sys
 from pathlib import Path
 
-import matplotlib
-import matplotlib.pyplot as plt
-from jinja2 import DebugUndefined, Template
-from matplotlib import rcParams
-from prodigy import set_hashes
 from prodigy.components.loaders import JSONL
 from prodigy.core import Arg, recipe
 
-# Configure matplotlib for LaTeX rendering
-matplotlib.use("Agg")  # Use non-interactive backend
-rcParams["text.usetex"] = False
-rcParams["text.latex.preamble"] = r"\usepackage{amsmath,amssymb,amsfonts}"
-rcParams["mathtext.fontset"] = "cm"  # Computer Modern font (TeX-like)
-
-
-def latex_to_svg_base64(latex_str):
-    """
-    Convert a LaTeX string to an SVG and return as base64-encoded
-    string using matplotlib.
-
-    Args:
-        latex_str: The LaTeX string to render
-        is_variable: Whether this is a single variable (for better inline alignment)
-
-    Returns:
-        Base64 encoded SVG image
-    """
-    try:
-        fig = plt.figure(figsize=(0.1, 0.3), dpi=100, frameon=False)
-        fontsize = 14
-
-        # Eliminate all margins
-        plt.subplots_adjust(0, 0, 1, 1)
-        ax = fig.add_subplot(111)
-        ax.axis("off")
-
-        # For equations, ensure proper math formatting
-        ax.text(
-            0.5,
-            0.5,
-            f"${latex_str}$",
-            size=fontsize,
-            ha="center",
-            va="center",
-            transform=ax.transAxes,
-        )
-
-        # Tightest possible bbox with minimal padding
-        buffer = BytesIO()
-        plt.savefig(
-            buffer, format="svg", bbox_inches="tight", pad_inches=0.01, transparent=True
-        )
-        plt.close(fig)
-
-        # Convert to base64
-        buffer.seek(0)
-        svg_base64 = base64.b64encode(buffer.read()).decode("utf-8")
-        return f"data:image/svg+xml;base64,{svg_base64}"
-    except Exception as e:
-        print(f"Error rendering LaTeX: {latex_str} - {str(e)}")
-        return None
-
-
-def process_latex_in_text(text):
-    """
-    Find LaTeX expressions in text and replace with SVG images.
-    Uses specialized handling for inline variables vs. equations.
-    Supports both types of syntax for inline equations.
-    """
-    # First, temporarily replace escaped dollar signs \$ and
-    # escaped parentheses \( \) so they don't match our patterns
-    text = re.sub(r"(\\\$)", r"ESCAPED_DOLLAR_PLACEHOLDER", text)
-
-    # Replace "\le" and "\ge" with their LaTeX equivalents
-    text = text.replace(r"\le", r"\leq")
-    text = text.replace(r"\ge", r"\geq")
-
-    # Pattern for inline LaTeX equations with dollar signs: $...$
-    # (but not single variables or currency)
-    inline_dollar_pattern = r"\$([^\$]+?)\$"
-
-    # Pattern for inline LaTeX equations with parentheses: \(...\)
-    inline_paren_pattern = r"\\\((.+?)\\\)"
-
-    # Process inline LaTeX equations with dollar signs
-    def replace_inline_latex(match):
-        latex = match.group(1)
-        svg_base64 = latex_to_svg_base64(latex)
-        if svg_base64:
-            return f'<img class="latex-inline" src="{svg_base64}" alt="{latex}" />'
-        return match.group(0)
-
-    # Apply replacements
-    text = re.sub(inline_dollar_pattern, replace_inline_latex, text)
-    text = re.sub(inline_paren_pattern, replace_inline_latex, text)
-
-    # Fix whitespace
-    text = text.replace(r"\n", "<br>")
-
-    # Restore escaped characters
-    text = text.replace("ESCAPED_DOLLAR_PLACEHOLDER", "$")
+# Make the shared rendering package in recipes/ importable when loaded with -F
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from ume_render import timing  # noqa: E402
+from ume_render.compiled import stale_files  # noqa: E402
+from ume_render.katex import recipe_javascript  # noqa: E402
+from ume_render.latex import forget_prerendered  # noqa: E402
+from ume_render.metrics import Metrics, mount_metrics  # noqa: E402
+from ume_render.parallel import prerender_latex  # noqa: E402
+from ume_render.routing import OverlapRouter  # noqa: E402
+from ume_render.serving import (  # noqa: E402
+    answered_input_hashes,
+    connect_db,
+    hash_task,
+    input_hash,
+    load_answers,
+    report_stream,
+    serve_assets,
+    skip_answered,
+)
+from ume_render.tasks import (  # noqa: E402
+    RATING_RENDER_FIELDS,
+    batched,
+    rating_texts,
+    render_rating_task,
+    strip_render_fields,
+)
+from ume_render.templates import get_template  # noqa: E402
 
-    return text
+# Number of tasks loaded and rendered at a time with --lazy
+LAZY_BATCH_SIZE = 10
 
 
 @recipe(
     "select-suggest",
     dataset=Arg(help="Dataset to save answers to"),
     inputs_path=Arg(help="Path to jsonl inputs"),
+    workers=Arg("--workers", "-w", help="Processes to use for pre-rendering LaTeX"),
+    compiled=Arg(
+        "--compiled", "-C", help="Inputs were built by scripts/compile-tasks.py"
+    ),
+    lazy=Arg("--lazy", "-L", help="Load, render and hash tasks on demand"),
+    overlap=Arg(
+        "--overlap", "-O", help="Route each item to this many different annotators"
+    ),
+    journal=Arg("--journal", "-J", help="Save answers to this local journal first"),
 )
 def select_suggest(
     dataset,
     inputs_path: Path,
+    workers: int = 1,
+    compiled: bool = False,
+    lazy: bool = False,
+    overlap: int = 0,
+    journal: Path = None,
 ):
 
-    mcq_template_path = Path(__file__).parent / "mcq.jinja2"
-    with mcq_template_path.open("r", encoding="utf8") as file_:
-        mcq_template = Template(file_.read(), undefined=DebugUndefined)
+    mcq_template = get_template("select-suggest")
+    metrics = Metrics("select-suggest", dataset)
 
     reset_button_html_path = Path(__file__).parent / "reset_button.html"
     with reset_button_html_path.open("r", encoding="utf8") as file_:
         reset_button_html = file_.read()
 
+    input_paths = list(inputs_path.glob("*.jsonl"))
+
+    # Drop the items already answered in the dataset before rendering them,
+    # rather than leaving it to Prodigy. With --overlap the router decides
+    db = connect_db(journal)
+    answered = set() if overlap else answered_input_hashes(dataset, db)
+
     def get_stream():
         json_lines = []
-        for input_path in list(inputs_path.glob("*.jsonl")):
-            json_lines.extend(list(JSONL(input_path)))
-
-        for item in json_lines:
-            # Store the original revision text to allow resetting
-            item["question_orig"] = item["question"]
-            item["choice_A_orig"] = item["choice_A"]
-            item["choice_B_orig"] = item["choice_B"]
-            item["choice_C_orig"] = item["choice_C"]
-            item["choice_D_orig"] = item["choice_D"]
-
-            item["display_question"] = process_latex_in_text(item["question"])
-            item["display_choice_A"] = process_latex_in_text(item["choice_A"])
-            item["display_choice_B"] = process_latex_in_text(item["choice_B"])
-            item["display_choice_C"] = process_latex_in_text(item["choice_C"])
-            item["display_choice_D"] = process_latex_in_text(item["choice_D"])
-            item["html"] = mcq_template.render(**item)
-
-            yield item
+        with timing.stage("load"):
+            for input_path in input_paths:
+                json_lines.extend(skip_answered(JSONL(input_path), answered))
+
+        # Precompiled tasks are already rendered and hashed
+        if compiled:
+            stale = stale_files(inputs_path)
+            if stale:
+                print("WARNING: compiled tasks are out of date: ", stale)
+            yield from json_lines
+            return
+
+        with metrics.rendering(len(json_lines)):
+            prerender_latex(rating_texts(json_lines), workers)
+            tasks = [render_rating_task(item, mcq_template) for item in json_lines]
+        yield from tasks
+
+    def get_lazy_stream():
+        items = (item for input_path in input_paths for item in JSONL(input_path))
+        for batch in batched(skip_answered(items, answered), LAZY_BATCH_SIZE):
+            if not compiled:
+                with metrics.rendering(len(batch)):
+                    prerender_latex(rating_texts(batch), workers, keep_pool=True)
+                    batch = [render_rating_task(item, mcq_template) for item in batch]
+                forget_prerendered()
+            for item in batch:
+                yield hash_task(item)
+
+    def count_input_hashes():
+        # Only the idx goes into the input hash, so there's no need to
+        # render (or keep) the tasks to check for duplicates
+        n_tasks = 0
+        input_hashes = set()
+        for input_path in input_paths:
+            for item in skip_answered(JSONL(input_path), answered):
+                n_tasks += 1
+                input_hashes.add(input_hash(item))
+        return n_tasks, len(input_hashes)
 
     # We can use the blocks to override certain config and content, and set
     # "text": None for the choice interface so it doesn't also render the text
@@ -220,15 +187,46 @@ def select_suggest(
         },
     ]
 
-    reset_button_js = (Path(__file__).parent / "reset_button.js").read_text()
-    stream = get_stream()
-    stream = [set_hashes(eg, input_keys=["idx"]) for eg in stream]
+    def prepare_task(item):
+        if not compiled:
+            with metrics.rendering(1):
+                prerender_latex(rating_texts([item]), workers, keep_pool=True)
+                item = render_rating_task(item, mcq_template)
+            forget_prerendered()
+        return hash_task(item)
 
-    print("Length of stream: ", len(stream))
-    print(
-        "Unique input hashes in stream: ",
-        len(set([eg["_input_hash"] for eg in stream]))
-    )
+    reset_button_js = (Path(__file__).parent / "reset_button.js").read_text()
+    router = None
+    if overlap and lazy:
+        # Only render the items as the router hands them out
+        items = [item for input_path in input_paths for item in JSONL(input_path)]
+        router = OverlapRouter(items, target=overlap)
+        stream = router.stream(prepare=prepare_task)
+        # Only the idx goes into the input hash
+        n_tasks, n_input_hashes = len(items), len(router.tasks)
+    elif lazy:
+        stream = get_lazy_stream()
+        n_tasks, n_input_hashes = count_input_hashes()
+    else:
+        stream = get_stream()
+        stream = [hash_task(eg) for eg in stream]
+        n_tasks = len(stream)
+        n_input_hashes = len(set([eg["_input_hash"] for eg in stream]))
+        if overlap:
+            router = OverlapRouter(stream, target=overlap)
+            stream = router.stream()
+
+    if router is not None:
+        router.seed(load_answers(dataset, db))
+        print(
+            f"Overlap routing: {router.retired} of {len(router.tasks)} items "
+            f"already have {overlap} complete ratings"
+        )
+    report_stream(n_tasks, n_input_hashes)
+    serve_assets()
+    metrics.n_tasks = n_tasks
+    stream = metrics.serve(stream)
+    mount_metrics(metrics)
 
     def validate_answer(eg):
         required_fields = ["overall", "topic", "vocabulary", "choices"]
@@ -239,13 +237,33 @@ def select_suggest(
         if errors:
             raise ValueError("\n".join(errors))
 
-    return {
+    def update(answers):
+        metrics.update(answers)
+        if router is not None:
+            router.update(answers)
+
+    def before_db(examples):
+        # The rendered fields are only needed to show the task and can be
+        # rebuilt with scripts/rerender-annotations.py, so don't store them
+        return strip_render_fields(examples, RATING_RENDER_FIELDS)
+
+    components = {
         "dataset": dataset,
         "view_id": "blocks",
         "validate_answer": validate_answer,
         "stream": stream,
+        "update": update,
+        "before_db": before_db,
         "config": {
             "blocks": blocks,
-            "javascript": reset_button_js,
+            "javascript": recipe_javascript(reset_button_js),
+            # Answered items are already filtered out above, or by the router
+            "auto_exclude_current": False,
         },
     }
+    if router is not None:
+        components["task_router"] = router.route
+    if journal is not None:
+        # Answers are saved to the database in the background
+        components["db"] = db
+    return components
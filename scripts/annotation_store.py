@@ -0,0 +1,169 @@
+"""
+Incremental export of Prodigy annotations from Postgres to Parquet.
+
+Each run only fetches the examples linked to a dataset since the last run:
+the highest link id exported so far is kept per dataset in watermarks.json.
+Rows are streamed through a server-side cursor in batches, the fields that
+only exist to render tasks are dropped, and each batch is appended to the
+dataset's directory as a new Parquet file. read_annotations() loads a
+dataset back, optionally with only some of its columns.
+
+Usage: python scripts/annotation_store.py ume-final ume2 [--store data/annotations]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "recipes"))
+from ume_render.fields import (  # noqa: E402
+    ADJUDICATION_RENDER_FIELDS,
+    RATING_RENDER_FIELDS,
+)
+
+DEFAULT_STORE = Path("data/annotations")
+BATCH_SIZE = 10_000
+WATERMARKS_NAME = "watermarks.json"
+
+# Older examples were saved with their rendered fields, which make up most of
+# their size. The hashes aren't needed for analysis either
+DROP_FIELDS = [
+    *RATING_RENDER_FIELDS,
+    *ADJUDICATION_RENDER_FIELDS,
+    "_input_hash",
+    "_task_hash",
+]
+
+# Links are only ever added, so their id orders the examples of a dataset by
+# when they were saved, including examples copied in from another dataset
+QUERY = """
+SELECT link.id, example.content
+FROM link
+JOIN example ON example.id = link.example_id
+JOIN dataset ON dataset.id = link.dataset_id
+WHERE dataset.name = %s AND link.id > %s
+ORDER BY link.id
+"""
+
+
+def connect():
+    """
+    Connect to Prodigy's database with the PGCONN connection string, or the
+    PGHOST, PGUSER etc. environment variables if it isn't set.
+    """
+    import psycopg2
+
+    return psycopg2.connect(os.getenv("PGCONN", ""))
+
+
+def _write_atomic(path, write):
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def read_watermarks(store=DEFAULT_STORE):
+    path = Path(store) / WATERMARKS_NAME
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def write_watermarks(watermarks, store=DEFAULT_STORE):
+    path = Path(store) / WATERMARKS_NAME
+    _write_atomic(
+        path, lambda tmp: Path(tmp).write_text(json.dumps(watermarks, indent=2))
+    )
+
+
+def export_dataset(conn, dataset, store=DEFAULT_STORE, batch_size=BATCH_SIZE):
+    """
+    Append the examples added to `dataset` since the last export to the
+    store. Returns the number of examples exported.
+    """
+    store = Path(store)
+    directory = store / dataset
+    directory.mkdir(parents=True, exist_ok=True)
+    watermarks = read_watermarks(store)
+
+    n_examples = 0
+    # A named cursor is a server-side cursor: rows are only sent as they're
+    # fetched, so the dataset is never loaded into memory all at once
+    with conn.cursor(name="export_annotations") as cursor:
+        cursor.itersize = batch_size
+        cursor.execute(QUERY, (dataset, watermarks.get(dataset, 0)))
+        while rows := cursor.fetchmany(batch_size):
+            records = []
+            for _, content in rows:
+                eg = json.loads(bytes(content))
+                for field in DROP_FIELDS:
+                    eg.pop(field, None)
+                records.append(eg)
+
+            first_id, last_id = rows[0][0], rows[-1][0]
+            path = directory / f"part-{first_id:012d}-{last_id:012d}.parquet"
+            df = pd.DataFrame.from_records(records)
+            _write_atomic(path, lambda tmp: df.to_parquet(tmp, index=False))
+            # Only move the watermark once the batch is safely on disk, so an
+            # interrupted export picks up where it stopped
+            watermarks[dataset] = last_id
+            write_watermarks(watermarks, store)
+            n_examples += len(rows)
+    conn.rollback()
+    return n_examples
+
+
+def read_annotations(dataset, columns=None, store=DEFAULT_STORE):
+    """
+    Load an exported dataset. If `columns` is given, only those columns are
+    read from disk. Raises FileNotFoundError if the dataset hasn't been
+    exported yet.
+    """
+    import pyarrow.parquet as pq
+
+    paths = sorted((Path(store) / dataset).glob("part-*.parquet"))
+    if not paths:
+        raise FileNotFoundError(
+            f"No exported annotations for {dataset!r} in {store}, run "
+            f"`python scripts/annotation_store.py {dataset}` first"
+        )
+    frames = []
+    for path in paths:
+        if columns is None:
+            frames.append(pd.read_parquet(path))
+            continue
+        # Fields that didn't exist yet when an older batch was exported
+        # are missing from its file
+        names = pq.read_schema(path).names
+        frames.append(
+            pd.read_parquet(path, columns=[c for c in columns if c in names])
+        )
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("datasets", nargs="+", help="Prodigy datasets to export")
+    parser.add_argument("--store", type=Path, default=DEFAULT_STORE)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    load_dotenv(override=True)
+    conn = connect()
+    try:
+        for dataset in args.datasets:
+            n_examples = export_dataset(conn, dataset, args.store, args.batch_size)
+            print(f"{dataset}: exported {n_examples} new examples")
+    finally:
+        conn.close()
@@ -0,0 +1,124 @@
+"""
+Time how long saving a batch of answers keeps an annotator waiting, with and
+without the answer journal (ume_render/journal.py), against a stand-in
+database that takes `--latency` seconds per call and is down for a while
+part-way through. Then check that every answer reached the database once,
+including the ones left in the journal by a process that stopped mid-save.
+
+Usage: python scripts/benchmark-journal.py [--latency S] [--batches N]
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "recipes"))
+from ume_render import journal  # noqa: E402
+from ume_render.journal import JournaledDatabase  # noqa: E402
+
+parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+parser.add_argument("--latency", type=float, default=0.2, help="Seconds per call")
+parser.add_argument("--batches", type=int, default=50, help="Batches of answers")
+parser.add_argument("--batch-size", type=int, default=10, help="Answers per batch")
+args = parser.parse_args()
+
+# Retry quickly, so the outage doesn't make the benchmark slow
+journal.RETRY_DELAY = journal.MAX_RETRY_DELAY = 0.1
+
+
+class SlowDatabase:
+    """Keeps examples in memory, taking `latency` seconds per call."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.examples = []
+        self.down = False
+        self._lock = threading.Lock()
+
+    def __contains__(self, name):
+        return True
+
+    def add_examples(self, examples, datasets=()):
+        time.sleep(self.latency)
+        if self.down:
+            raise ConnectionError("database unavailable")
+        with self._lock:
+            self.examples.extend(examples)
+
+    def get_input_hashes(self, *names):
+        with self._lock:
+            return {eg["_input_hash"] for eg in self.examples}
+
+
+def batches():
+    for i in range(args.batches):
+        yield [
+            {"idx": n, "_input_hash": n, "_task_hash": n, "overall": "3"}
+            for n in range(i * args.batch_size, (i + 1) * args.batch_size)
+        ]
+
+
+def save_all(db, outage):
+    """Save every batch, with the database down for the middle third."""
+    seconds = []
+    for i, examples in enumerate(batches()):
+        db_down = args.batches // 3 <= i < 2 * args.batches // 3
+        outage.down = db_down
+        start = time.perf_counter()
+        try:
+            db.add_examples(examples, datasets=["ume"])
+        except ConnectionError:
+            pass
+        seconds.append(time.perf_counter() - start)
+    outage.down = False
+    return seconds
+
+
+def report(name, seconds):
+    ms = sorted(s * 1000 for s in seconds)
+    p99 = ms[min(int(0.99 * len(ms)), len(ms) - 1)]
+    print(f"{name:<10} {statistics.median(ms):>9.2f} {p99:>9.2f} {max(ms):>9.2f}")
+
+
+n_answers = args.batches * args.batch_size
+print(f"{args.batches} batches of {args.batch_size} answers, {args.latency}s per call")
+print(f"{'saving':<10} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+
+direct = SlowDatabase(args.latency)
+report("direct", save_all(direct, direct))
+print(f"  saved {len(direct.examples)} of {n_answers}, the rest failed")
+
+with tempfile.TemporaryDirectory() as tmp:
+    path = Path(tmp) / "answers.sqlite"
+    db = SlowDatabase(args.latency)
+    journaled = JournaledDatabase(db, path, interval=0.1)
+    report("journal", save_all(journaled, db))
+    answered = len(journaled.get_input_hashes("ume"))
+    print(f"  answered right after saving: {answered} of {n_answers}")
+    start = time.perf_counter()
+    journaled.close()
+    print(
+        f"  saved {len(db.examples)} of {n_answers}, "
+        f"{time.perf_counter() - start:.1f}s after the last answer"
+    )
+
+    # A process that stops before the worker saves anything: the next one
+    # saves what's in the journal
+    db = SlowDatabase(args.latency)
+    db.down = True
+    stopped = JournaledDatabase(db, path)
+    for examples in batches():
+        stopped.add_examples(examples, datasets=["ume"])
+    stopped._stop.set()
+    stopped._worker.join()
+    db.down = False
+    restarted = JournaledDatabase(db, path)
+    restarted.close()
+    saved = [eg["_input_hash"] for eg in db.examples]
+    print(
+        f"replay     saved {len(set(saved))} of {n_answers} after a restart, "
+        f"{len(saved) - len(set(saved))} twice"
+    )
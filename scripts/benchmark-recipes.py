@@ -0,0 +1,265 @@
+"""
+Benchmark the recipes' startup and stream building without Prodigy.
+
+Each scenario runs the real select-suggest or adjudicate recipe function,
+with Prodigy's imports replaced by small stand-ins, in a fresh process with
+an empty SVG cache, and consumes the whole stream. Corpora are the files in
+inputs/, or synthetic ones with --scale N: N copies of each item with new
+idx values and the digits changed, so every copy has new expressions to
+render.
+
+Reports items/s, LaTeX fragments/s, time to first task, startup time, peak
+memory and JSON bytes per task, and saves the results as JSON
+(default .cache/benchmarks/recipes-<time>.json) so runs can be compared.
+
+Usage: python scripts/benchmark-recipes.py [--scale N] [--workers N]
+                                           [--scenario NAME ...] [--output PATH]
+"""
+import argparse
+import contextlib
+import hashlib
+import importlib.util
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "recipes"))
+
+DIGITS = "0123456789"
+TEXT_FIELDS = {
+    f"{key}{suffix}"
+    for key in ["question", "choice_A", "choice_B", "choice_C", "choice_D"]
+    for suffix in ["", "_orig"]
+}
+
+SCENARIOS = {
+    "select-suggest": {
+        "recipe": "select-suggest",
+        "inputs": "inputs/ume-rating",
+        "options": {},
+    },
+    "select-suggest-lazy": {
+        "recipe": "select-suggest",
+        "inputs": "inputs/ume-rating",
+        "options": {"lazy": True},
+    },
+    "adjudicate": {
+        "recipe": "adjudicate",
+        "inputs": "inputs/ume-adjudication/subset-2.jsonl",
+        "options": {},
+    },
+}
+
+RECIPE_FILES = {
+    "select-suggest": ROOT / "recipes/universal-math-exam/select-suggest.py",
+    "adjudicate": ROOT / "recipes/universal-math-exam-adjudication/adjudicate.py",
+}
+
+
+def install_prodigy_stub():
+    """Stand-ins for the parts of Prodigy the recipes import."""
+
+    def set_hashes(eg, input_keys=("text",), task_keys=(), **kwargs):
+        def digest(keys):
+            values = json.dumps([eg.get(key) for key in keys], sort_keys=True)
+            return int(hashlib.md5(values.encode("utf8")).hexdigest()[:8], 16)
+
+        eg["_input_hash"] = digest(input_keys)
+        eg["_task_hash"] = digest([*input_keys, *task_keys])
+        return eg
+
+    def JSONL(path):
+        with Path(path).open("r", encoding="utf8") as file_:
+            for line in file_:
+                if line.strip():
+                    yield json.loads(line)
+
+    def recipe(name, **kwargs):
+        return lambda func: func
+
+    class Router:
+        routes = []
+
+    class Database:
+        # Every run starts from an empty dataset
+        def __contains__(self, name):
+            return False
+
+    modules = {
+        "prodigy": {"set_hashes": set_hashes},
+        "prodigy.components": {},
+        "prodigy.components.loaders": {"JSONL": JSONL},
+        "prodigy.components.db": {"connect": Database},
+        "prodigy.core": {"Arg": lambda *args, **kwargs: None, "recipe": recipe},
+        "prodigy.app": {"app": types.SimpleNamespace(router=Router, routes=[])},
+    }
+    for name, attrs in modules.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(attrs)
+        sys.modules[name] = module
+
+
+def synthetic_corpus(inputs, scale, directory):
+    """
+    Write `scale` copies of the items in `inputs` (a file or directory of
+    JSONL files) to `directory`, and return the path to use as the inputs.
+    """
+    inputs = ROOT / inputs
+    paths = sorted(inputs.glob("*.jsonl")) if inputs.is_dir() else [inputs]
+    directory.mkdir(parents=True, exist_ok=True)
+    for path in paths:
+        items = [json.loads(line) for line in path.open() if line.strip()]
+        max_idx = max(item["idx"] for item in items) + 1
+        with (directory / path.name).open("w", encoding="utf8") as file_:
+            for copy in range(scale):
+                # Shift every digit, so the copies' expressions are new
+                shift = copy % 10
+                digits = str.maketrans(DIGITS, DIGITS[shift:] + DIGITS[:shift])
+                for item in items:
+                    item = {
+                        key: value.translate(digits) if key in TEXT_FIELDS else value
+                        for key, value in item.items()
+                    }
+                    item["idx"] = item["idx"] + copy * max_idx
+                    file_.write(json.dumps(item) + "\n")
+    return directory if inputs.is_dir() else directory / paths[0].name
+
+
+def run_scenario(name, inputs, workers):
+    """Run one scenario in this process and return its measurements."""
+    install_prodigy_stub()
+    scenario = SCENARIOS[name]
+    spec = importlib.util.spec_from_file_location(
+        scenario["recipe"], RECIPE_FILES[scenario["recipe"]]
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    from ume_render import tasks
+    from ume_render.tokenizer import find_latex
+
+    recipe_func = (
+        module.select_suggest
+        if scenario["recipe"] == "select-suggest"
+        else module.adjudicate
+    )
+    texts = (
+        tasks.rating_texts
+        if scenario["recipe"] == "select-suggest"
+        else tasks.adjudication_texts
+    )
+
+    # Keep the recipes' own output out of the results
+    with contextlib.redirect_stdout(sys.stderr):
+        start = time.perf_counter()
+        components = recipe_func(
+            "benchmark", Path(inputs), workers=workers, **scenario["options"]
+        )
+        startup = time.perf_counter() - start
+
+        n_tasks = 0
+        n_fragments = 0
+        n_bytes = 0
+        first_task = None
+        for eg in components["stream"]:
+            if first_task is None:
+                first_task = time.perf_counter() - start
+            n_tasks += 1
+            n_fragments += sum(len(find_latex(text)) for text in texts([eg]))
+            n_bytes += len(json.dumps(eg))
+        total = time.perf_counter() - start
+
+    return {
+        "scenario": name,
+        "tasks": n_tasks,
+        "fragments": n_fragments,
+        "startup_s": startup,
+        "time_to_first_task_s": first_task,
+        "total_s": total,
+        "items_per_s": n_tasks / total,
+        "fragments_per_s": n_fragments / total,
+        "bytes_per_task": n_bytes / max(n_tasks, 1),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_memory_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def git_commit():
+    result = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    return result.stdout.strip() or None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenario", nargs="+", choices=list(SCENARIOS))
+    parser.add_argument("--scale", type=int, default=1, help="Copies of each item")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--run", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        # Child process: run a single scenario and print its results
+        result = run_scenario(args.run[0], args.run[1], args.workers)
+        print(json.dumps(result))
+        sys.exit(0)
+
+    from ume_render import config
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in args.scenario or list(SCENARIOS):
+            inputs = ROOT / SCENARIOS[name]["inputs"]
+            if args.scale > 1:
+                corpus_dir = Path(tmp_dir) / "corpus" / name
+                inputs = synthetic_corpus(inputs, args.scale, corpus_dir)
+            # Start every scenario from an empty SVG cache
+            env = {**os.environ, "LATEX_CACHE_DIR": str(Path(tmp_dir) / name)}
+            child = subprocess.run(
+                [sys.executable, __file__, "--run", name, str(inputs)]
+                + ["--workers", str(args.workers)],
+                cwd=ROOT,
+                env=env,
+                capture_output=True,
+                text=True,
+            )
+            if child.returncode != 0:
+                sys.exit(f"{name} failed:\n{child.stderr}")
+            results.append(json.loads(child.stdout.strip().splitlines()[-1]))
+
+    print(
+        f"{'scenario':<20} {'tasks':>6} {'items/s':>8} {'frag/s':>8} "
+        f"{'first s':>8} {'start s':>8} {'peak MB':>8} {'B/task':>8}"
+    )
+    for r in results:
+        print(
+            f"{r['scenario']:<20} {r['tasks']:>6} {r['items_per_s']:>8.1f} "
+            f"{r['fragments_per_s']:>8.1f} {r['time_to_first_task_s']:>8.2f} "
+            f"{r['startup_s']:>8.2f} {r['peak_memory_mb']:>8.0f} "
+            f"{r['bytes_per_task']:>8.0f}"
+        )
+
+    output = args.output or ROOT / ".cache" / "benchmarks" / time.strftime(
+        "recipes-%Y%m%d-%H%M%S.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    run = {
+        "commit": git_commit(),
+        "scale": args.scale,
+        "workers": args.workers,
+        "settings": config.settings(),
+        "results": results,
+    }
+    output.write_text(json.dumps(run, indent=2))
+    print(f"\nSaved results to {output}")
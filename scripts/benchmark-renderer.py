@@ -0,0 +1,99 @@
+"""
+Compare the figure and mathtext LaTeX renderers on every expression found
+in inputs/, rendering one expression per call and in batches. Reports
+throughput and output size per fragment, and checks that batches render
+the same SVGs as single calls.
+
+Usage: python scripts/benchmark-renderer.py [inputs_dir] [batch_size]
+"""
+import base64
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "recipes"))
+from ume_render.latex import BATCH_RENDERERS, RENDERERS  # noqa: E402
+from ume_render.tokenizer import find_latex  # noqa: E402
+
+TEXT_FIELDS = ["question", "choice_A", "choice_B", "choice_C", "choice_D"]
+
+inputs_dir = Path(sys.argv[1] if len(sys.argv) > 1 else "inputs")
+# The default is about the number of expressions in an adjudication task
+batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+
+expressions = []
+for input_path in sorted(inputs_dir.glob("*/*.jsonl")):
+    with input_path.open("r", encoding="utf8") as file_:
+        for line in file_:
+            item = json.loads(line)
+            for field in TEXT_FIELDS:
+                for key in [field, f"{field}_orig"]:
+                    if item.get(key):
+                        expressions.extend(find_latex(item[key]))
+
+distinct = sorted(set(expressions))
+print(f"Expressions: {len(expressions)} ({len(distinct)} distinct)")
+
+
+def render_single(render, latex_strs):
+    results = []
+    for latex_str in latex_strs:
+        try:
+            results.append(render(latex_str))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def render_batches(render_batch, latex_strs):
+    results = []
+    for i in range(0, len(latex_strs), batch_size):
+        results.extend(render_batch(latex_strs[i : i + batch_size]))
+    return results
+
+
+results = {}
+outputs = {}
+for name in RENDERERS:
+    for mode, run, render in [
+        ("single", render_single, RENDERERS[name]),
+        (f"batch/{batch_size}", render_batches, BATCH_RENDERERS[name]),
+    ]:
+        # Warm up font loading and mathtext caches before timing
+        RENDERERS[name]("x")
+
+        start = time.perf_counter()
+        svgs = run(render, distinct)
+        elapsed = time.perf_counter() - start
+
+        sizes = [len(svg) for svg in svgs if isinstance(svg, bytes)]
+        base64_sizes = [
+            len(base64.b64encode(svg)) for svg in svgs if isinstance(svg, bytes)
+        ]
+        rendered = max(len(sizes), 1)
+        results[f"{name} {mode}"] = {
+            "fragments_per_sec": len(distinct) / elapsed,
+            "ms_per_fragment": elapsed / len(distinct) * 1000,
+            "svg_bytes_per_fragment": sum(sizes) / rendered,
+            "base64_bytes_per_fragment": sum(base64_sizes) / rendered,
+            "failures": len(svgs) - len(sizes),
+        }
+        outputs.setdefault(name, []).append(
+            [svg if isinstance(svg, bytes) else None for svg in svgs]
+        )
+
+print()
+print(f"{'renderer':<18} {'frag/s':>8} {'ms/frag':>8} {'svg B':>8} {'b64 B':>8} {'fail':>5}")
+for name, r in results.items():
+    print(
+        f"{name:<18} {r['fragments_per_sec']:>8.1f} {r['ms_per_fragment']:>8.2f} "
+        f"{r['svg_bytes_per_fragment']:>8.0f} {r['base64_bytes_per_fragment']:>8.0f} "
+        f"{r['failures']:>5}"
+    )
+
+print()
+for name, (single, batch) in outputs.items():
+    same = sum(a == b for a, b in zip(single, batch))
+    print(f"{name}: batch output identical for {same}/{len(single)} expressions")
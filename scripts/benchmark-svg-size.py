@@ -0,0 +1,71 @@
+"""
+Measure how much smaller compact SVGs make the tasks built from inputs/.
+
+Every task is built three times: with the current output (base64 data URIs
+of the SVGs as written by matplotlib, i.e. latex_to_svg_base64), with the
+compacted SVGs as data URIs, and with the compacted SVGs inlined and their
+glyphs shared per task (LATEX_OUTPUT=svg). Reports the bytes of math and of
+HTML per task for each. Expressions are rendered once, through the SVG
+cache, with the renderer from LATEX_RENDERER.
+
+Usage: python scripts/benchmark-svg-size.py [inputs_dir] [--precision N]
+"""
+import argparse
+import copy
+import json
+import re
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "recipes"))
+from ume_render import config, tasks  # noqa: E402
+from ume_render.templates import get_template  # noqa: E402
+
+# The images in a task's HTML, and the shared glyphs of LATEX_OUTPUT=svg
+MATH_PATTERN = re.compile(
+    r'<img class="latex-inline".*?/>|<svg .*?</svg>', re.DOTALL
+)
+
+parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+parser.add_argument("inputs_dir", nargs="?", type=Path, default=Path("inputs"))
+parser.add_argument("--precision", type=int, default=2, help="Decimals to keep")
+args = parser.parse_args()
+
+items = []
+for input_path in sorted(args.inputs_dir.glob("*/*.jsonl")):
+    with input_path.open("r", encoding="utf8") as file_:
+        items.extend(json.loads(line) for line in file_ if line.strip())
+
+
+def build_tasks():
+    html = []
+    for item in copy.deepcopy(items):
+        # Adjudication items carry the original text next to the revision
+        if "question_orig" in item:
+            task = tasks.render_adjudication_task(item, get_template("adjudicate"))
+        else:
+            task = tasks.render_rating_task(item, get_template("select-suggest"))
+        html.append(task["html"])
+    return html
+
+
+modes = [
+    ("current (base64)", {"output": "inline"}),
+    ("compact (base64)", {"output": "inline", "svg_precision": args.precision}),
+    ("compact + shared glyphs", {"output": "svg", "svg_precision": args.precision}),
+]
+print(f"Tasks: {len(items)}, renderer: {config.RENDERER}")
+print(f"{'output':<26} {'math KB':>9} {'B/task':>8} {'HTML KB':>9} {'saved':>7}")
+baseline = None
+for name, settings in modes:
+    config.configure(**settings)
+    html = build_tasks()
+    math_bytes = sum(len(m) for h in html for m in MATH_PATTERN.findall(h))
+    html_bytes = sum(len(h) for h in html)
+    if baseline is None:
+        baseline = math_bytes
+    saved = 1 - math_bytes / baseline
+    print(
+        f"{name:<26} {math_bytes / 1024:>9.0f} {math_bytes / len(html):>8.0f} "
+        f"{html_bytes / 1024:>9.0f} {saved:>7.1%}"
+    )
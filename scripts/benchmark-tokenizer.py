@@ -0,0 +1,123 @@
+"""
+Check the LaTeX tokenizer against a corpus of every text field in inputs/,
+and time it against the regex pipeline it replaced. Rendering is stubbed out
+so only the text processing is measured.
+
+Usage: python scripts/benchmark-tokenizer.py [inputs_dir]
+"""
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "recipes"))
+from ume_render.tokenizer import MATH, TEXT, substitute, tokenize  # noqa: E402
+
+TEXT_FIELDS = ["question", "choice_A", "choice_B", "choice_C", "choice_D"]
+REPEATS = 20
+
+inputs_dir = Path(sys.argv[1] if len(sys.argv) > 1 else "inputs")
+
+# Cases taken from inputs/, with the segments they should produce
+CASES = [
+    (
+        r"charges a \$12 booking fee. The total cost $C$ in dollars",
+        [(TEXT, "charges a $12 booking fee. The total cost "), (MATH, "C"),
+         (TEXT, " in dollars")],
+    ),
+    (r"$9m + 12n \geq 150$", [(MATH, r"9m + 12n \geq 150")]),
+    (r"$9t + 12w \ge 150$", [(MATH, r"9t + 12w \geq 150")]),
+    (r"$21(t + w) \le 150$", [(MATH, r"21(t + w) \leq 150")]),
+    (
+        r"$\left(\frac{1}{2}\right)^x$",
+        [(MATH, r"\left(\frac{1}{2}\right)^x")],
+    ),
+    (
+        r"where \(m\) is the number of hours",
+        [(TEXT, "where "), (MATH, "m"), (TEXT, " is the number of hours")],
+    ),
+    (r"$x \neq 2$", [(MATH, r"x \neq 2")]),
+    (r"Solve:\n$L + S = 12$", [(TEXT, "Solve:<br>"), (MATH, "L + S = 12")]),
+    (r"$a \$ b$ costs \$3", [(MATH, r"a \$ b"), (TEXT, " costs $3")]),
+    (
+        r"$L + S = 12\n6L + 6S = 72$",
+        [(MATH, "L + S = 12"), (TEXT, "<br>"), (MATH, "6L + 6S = 72")],
+    ),
+    (
+        r"50 + $\(\frac{25}{4}\)$π",
+        [(TEXT, "50 + "), (MATH, r"\frac{25}{4}"), (TEXT, "π")],
+    ),
+    (
+        r"the equation \( $2x^2 + 6x + 1 = 0$ \)?",
+        [(TEXT, "the equation "), (MATH, "2x^2 + 6x + 1 = 0"), (TEXT, "?")],
+    ),
+]
+
+
+def legacy_process(text, render):
+    """The regex pipeline process_latex_in_text used before the tokenizer."""
+    text = re.sub(r"(\\\$)", r"ESCAPED_DOLLAR_PLACEHOLDER", text)
+    text = text.replace(r"\le", r"\leq")
+    text = text.replace(r"\ge", r"\geq")
+
+    def replace_inline_latex(match):
+        return render(match.group(1))
+
+    text = re.sub(r"\$([^\$]+?)\$", replace_inline_latex, text)
+    text = re.sub(r"\\\((.+?)\\\)", replace_inline_latex, text)
+    text = text.replace(r"\n", "<br>")
+    text = text.replace("ESCAPED_DOLLAR_PLACEHOLDER", "$")
+    return text
+
+
+def tokenizer_process(text, render):
+    return substitute(text, lambda latex_str, source: render(latex_str))
+
+
+def stub_render(latex_str):
+    return f"<img alt={latex_str!r}>"
+
+
+failures = 0
+for text, expected in CASES:
+    segments = [(kind, value) for kind, value, _ in tokenize(text)]
+    joined = "".join(
+        stub_render(value) if kind == MATH else value for kind, value, _ in tokenize(text)
+    )
+    if segments != expected or joined != tokenizer_process(text, stub_render):
+        failures += 1
+        print(f"FAIL {text!r}\n  expected {expected}\n  got      {segments}")
+print(f"Cases: {len(CASES) - failures}/{len(CASES)} passed")
+
+corpus = []
+for input_path in sorted(inputs_dir.glob("*/*.jsonl")):
+    with input_path.open("r", encoding="utf8") as file_:
+        for line in file_:
+            item = json.loads(line)
+            for field in TEXT_FIELDS:
+                for key in [field, f"{field}_orig"]:
+                    if isinstance(item.get(key), str):
+                        corpus.append(item[key])
+
+differences = [
+    text
+    for text in corpus
+    if legacy_process(text, stub_render) != tokenizer_process(text, stub_render)
+]
+print(f"Corpus: {len(corpus)} texts, {len(differences)} processed differently")
+for text in differences[:5]:
+    print(f"  {text[:100]!r}")
+    print(f"    legacy:    {legacy_process(text, stub_render)[:100]!r}")
+    print(f"    tokenizer: {tokenizer_process(text, stub_render)[:100]!r}")
+
+for name, process in [("legacy", legacy_process), ("tokenizer", tokenizer_process)]:
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        for text in corpus:
+            process(text, stub_render)
+    elapsed = time.perf_counter() - start
+    per_text = elapsed / (REPEATS * len(corpus)) * 1e6
+    print(f"{name:<10} {per_text:8.2f} us/text")
+
+sys.exit(1 if failures else 0)
@@ -0,0 +1,140 @@
+"""
+Time the triage rules in scripts/triage.py against the per-group pandas
+callbacks get_samples.py used before, on synthetic annotation tables, and
+check that both select the same items with the same output.
+
+Usage: python scripts/benchmark-triage.py [n_rows ...]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import triage
+
+SIZES = [int(n) for n in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+# The per-group callbacks take minutes beyond this
+LEGACY_MAX_ROWS = 100_000
+
+
+def synthetic_annotations(n_rows, seed=0):
+    """Several annotators rating items, with some skipped or invalid scores."""
+    rng = np.random.default_rng(seed)
+    n_items = max(n_rows // 3, 1)
+    idx = rng.integers(0, n_items, n_rows)
+    df = pd.DataFrame(
+        {
+            "idx": idx,
+            "_annotator_id": rng.choice([f"ume-{i}" for i in range(12)], n_rows),
+            # Coarse timestamps, so some ratings are tied
+            "_timestamp": rng.integers(1_700_000_000, 1_700_000_000 + n_rows, n_rows),
+        }
+    )
+    for column in triage.SCORE_COLUMNS:
+        df[column] = rng.choice(["1", "2", "3", "3", "2", "", "4"], n_rows)
+    for column in triage.TEXT_COLUMNS:
+        revision = rng.integers(0, 3, n_rows)
+        df[column] = [f"{column} {i} v{r}" for i, r in zip(idx, revision)]
+        df[f"{column}_orig"] = [f"{column} {i} v0" for i in idx]
+    df["correct_answer"] = rng.choice(list("ABCD"), n_rows)
+    return df
+
+
+def legacy_completion_idx(df):
+    def filter_incomplete_responses(group):
+        valid_values = [1, 2, 3]
+        valid_group = group[
+            group["overall"].isin(valid_values)
+            & group["topic"].isin(valid_values)
+            & group["vocabulary"].isin(valid_values)
+            & group["choices"].isin(valid_values)
+        ]
+        if valid_group["_annotator_id"].nunique() >= 2:
+            return False
+        return True
+
+    return (
+        df.groupby("idx")
+        .filter(filter_incomplete_responses)
+        .drop(columns=["_timestamp", "_annotator_id"])["idx"]
+        .unique()
+    )
+
+
+def legacy_adjudication_items(df, exclude_idx):
+    def filter_for_adjudication(group):
+        group = group[
+            group["overall"].notna()
+            & group["topic"].notna()
+            & group["vocabulary"].notna()
+            & group["choices"].notna()
+        ]
+        group = group.sort_values("_timestamp", ascending=True).drop_duplicates(
+            subset=["_annotator_id"]
+        )
+        if len(group) < 2:
+            return False
+        elif len(group) > 2:
+            group = group.head(2)
+        overall_greater_than_one = all(group["overall"] > 1)
+        overall_not_three = not all(group["overall"] == 3)
+        return overall_greater_than_one and overall_not_three
+
+    def consolidate_revisions(group):
+        row = group.iloc[0].copy()
+        if len(group) > 1:
+            revision_2 = group.iloc[1]
+            row["question_orig"] = revision_2["question"]
+            row["choice_A_orig"] = revision_2["choice_A"]
+            row["choice_B_orig"] = revision_2["choice_B"]
+            row["choice_C_orig"] = revision_2["choice_C"]
+            row["choice_D_orig"] = revision_2["choice_D"]
+        return row
+
+    return (
+        df[~(df["idx"].isin(exclude_idx))]
+        .groupby("idx")
+        .filter(filter_for_adjudication)
+        .drop(columns=["_timestamp", "_annotator_id"])
+        .groupby("idx")
+        .apply(consolidate_revisions, include_groups=False)
+        .reset_index()
+    )
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+mismatches = 0
+print(f"{'rows':>9} {'legacy s':>9} {'triage s':>9} {'speedup':>8} {'same':>5}")
+for n_rows in SIZES:
+    df = triage.prepare_scores(synthetic_annotations(n_rows))
+
+    def run_triage():
+        completion = triage.completion_idx(df)
+        return completion, triage.adjudication_items(df, completion)
+
+    (completion, adjudication), triage_time = timed(run_triage)
+    if n_rows > LEGACY_MAX_ROWS:
+        print(f"{n_rows:>9} {'-':>9} {triage_time:>9.2f} {'-':>8} {'-':>5}")
+        continue
+
+    def run_legacy():
+        completion = legacy_completion_idx(df)
+        return completion, legacy_adjudication_items(df, completion)
+
+    (legacy_completion, legacy_adjudication), legacy_time = timed(run_legacy)
+    same = list(completion) == list(legacy_completion) and adjudication.to_json(
+        orient="records", lines=True
+    ) == legacy_adjudication.to_json(orient="records", lines=True)
+    mismatches += not same
+    print(
+        f"{n_rows:>9} {legacy_time:>9.2f} {triage_time:>9.2f} "
+        f"{legacy_time / triage_time:>7.1f}x {'yes' if same else 'NO':>5}"
+    )
+
+sys.exit(1 if mismatches else 0)
@@ -0,0 +1,134 @@
+"""
+Check that the recipes' streams behave as Prodigy needs them to, without
+Prodigy: a stand-in controller asks for batches of tasks the way Prodigy's
+does, reading the stream until the batch is full or the stream runs out.
+Like Prodigy, the recipes' lazy streams are read from another thread than
+the one that ran the recipe.
+
+Usage: python scripts/check-streams.py
+"""
+import importlib.util
+import itertools
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "recipes"))
+from ume_render.metrics import Metrics  # noqa: E402
+from ume_render.routing import SCORE_FIELDS, OverlapRouter  # noqa: E402
+
+# Seconds a request may take before it counts as waiting on the stream
+MAX_REQUEST_SECONDS = 0.5
+
+
+class Controller:
+    """Hands out tasks to sessions through a task router, like Prodigy's."""
+
+    def __init__(self, stream, router, batch_size=10):
+        self.stream = stream
+        self.router = router
+        self.batch_size = batch_size
+        self.all_session_ids = []
+        self.queues = defaultdict(list)
+
+    def get_questions(self, session_id):
+        if session_id not in self.all_session_ids:
+            self.all_session_ids.append(session_id)
+        queue = self.queues[session_id]
+        while len(queue) < self.batch_size:
+            item = next(self.stream, None)
+            if item is None:
+                break
+            for session in self.router(self, session_id, item):
+                self.queues[session].append(item)
+        batch, queue[:] = queue[: self.batch_size], queue[self.batch_size :]
+        return batch
+
+
+def answer(router, session, batch):
+    scores = {field: "3" for field in SCORE_FIELDS}
+    router.update(
+        [{"idx": eg["idx"], "_session_id": session, **scores} for eg in batch]
+    )
+
+
+def timed(ctrl, session):
+    start = time.perf_counter()
+    batch = ctrl.get_questions(session)
+    elapsed = time.perf_counter() - start
+    if elapsed > MAX_REQUEST_SECONDS:
+        raise AssertionError(f"{session}'s request waited {elapsed:.1f}s")
+    return [eg["idx"] for eg in batch]
+
+
+def check_overlap_routing():
+    router = OverlapRouter([{"idx": i} for i in range(3)], target=2)
+    metrics = Metrics("select-suggest", "check")
+    ctrl = Controller(metrics.serve(router.stream()), router.route)
+
+    assert timed(ctrl, "a") == [0, 1, 2]
+    # a has been sent everything with open slots
+    assert timed(ctrl, "a") == []
+    assert timed(ctrl, "a") == []
+    # A session that joins later is still served
+    assert timed(ctrl, "b") == [0, 1, 2]
+    answer(router, "a", [{"idx": 0}, {"idx": 1}, {"idx": 2}])
+    answer(router, "b", [{"idx": 0}])
+    assert timed(ctrl, "c") == []
+    # Expired assignments can go to someone else
+    for idx in [1, 2]:
+        router.assigned[idx]["b"] -= router.timeout
+    assert timed(ctrl, "c") == [1, 2]
+    answer(router, "c", [{"idx": 1}, {"idx": 2}])
+    assert router.retired == 3
+    assert timed(ctrl, "d") == []
+    print("overlap routing: ok")
+
+
+def load_script(path):
+    spec = importlib.util.spec_from_file_location(path.stem.replace("-", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def check_lazy_streams():
+    # The recipe opens the SVG cache at startup, in this thread
+    os.environ["LATEX_CACHE_DIR"] = tempfile.mkdtemp()
+    load_script(ROOT / "scripts" / "benchmark-recipes.py").install_prodigy_stub()
+    recipe = load_script(ROOT / "recipes/universal-math-exam/select-suggest.py")
+    for options in [{"lazy": True}, {"lazy": True, "overlap": 2}]:
+        components = recipe.select_suggest(
+            "check", ROOT / "inputs" / "ume-rating", **options
+        )
+        tasks = []
+        errors = []
+
+        def read():
+            try:
+                tasks.extend(itertools.islice(components["stream"], 25))
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+        if errors:
+            raise errors[0]
+        assert len(tasks) == 25 and all("html" in eg for eg in tasks)
+        print(f"stream read from another thread, {options}: ok")
+
+
+def main():
+    check_overlap_routing()
+    check_lazy_streams()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
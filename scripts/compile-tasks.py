@@ -0,0 +1,83 @@
+"""
+Pre-build the rendered task files for every inputs/<name>/*.jsonl so the
+recipes can serve them with --compiled instead of rendering at startup.
+
+Files are only rebuilt when their source, the recipe's mcq.jinja2 or the
+renderer has changed since the last run (see compiled/<name>/manifest.json).
+
+Usage: python scripts/compile-tasks.py [--inputs inputs] [--output compiled]
+                                       [--workers N] [--force]
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "recipes"))
+from ume_render import compiled, tasks  # noqa: E402
+from ume_render.latex import get_cache  # noqa: E402
+from ume_render.parallel import prerender_latex  # noqa: E402
+from ume_render.serving import hash_task  # noqa: E402
+from ume_render.templates import TEMPLATES, get_template  # noqa: E402
+
+RECIPES = {
+    "select-suggest": {
+        "render": tasks.render_rating_task,
+        "texts": tasks.rating_texts,
+    },
+    "adjudicate": {
+        "render": tasks.render_adjudication_task,
+        "texts": tasks.adjudication_texts,
+    },
+}
+
+parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+parser.add_argument("--inputs", type=Path, default=Path("inputs"))
+parser.add_argument("--output", type=Path, default=Path("compiled"))
+parser.add_argument("--workers", type=int, default=1)
+parser.add_argument("--force", action="store_true", help="Rebuild every file")
+args = parser.parse_args()
+
+
+def read_jsonl(path):
+    with path.open("r", encoding="utf8") as file_:
+        return [json.loads(line) for line in file_ if line.strip()]
+
+
+for input_dir in sorted(p for p in args.inputs.iterdir() if p.is_dir()):
+    output_dir = args.output / input_dir.name
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = compiled.read_manifest(output_dir)
+
+    for source in sorted(input_dir.glob("*.jsonl")):
+        items = read_jsonl(source)
+        # Adjudication items carry the original text next to the revision
+        recipe_name = (
+            "adjudicate" if items and "question_orig" in items[0] else "select-suggest"
+        )
+        recipe = RECIPES[recipe_name]
+        output = output_dir / source.name
+
+        # Record the template relative to the repo, like the source paths
+        template = TEMPLATES[recipe_name].relative_to(ROOT)
+        entry = compiled.fingerprint(source, template, recipe_name)
+        if not args.force and output.exists() and manifest.get(source.name) == entry:
+            print(f"Up to date: {output}")
+            continue
+
+        print(f"Compiling {source} ({recipe_name}, {len(items)} items) to {output}")
+        mcq_template = get_template(recipe_name)
+        prerender_latex(recipe["texts"](items), args.workers)
+        with output.open("w", encoding="utf8") as file_:
+            for item in items:
+                task = recipe["render"](item, mcq_template)
+                task = hash_task(task)
+                file_.write(json.dumps(task) + "\n")
+
+        manifest[source.name] = entry
+        compiled.write_manifest(output_dir, manifest)
+
+if get_cache() is not None:
+    print("LaTeX SVG cache: ", get_cache().stats())
+print("Done!")
@@ -20,6 +20,8 @@ df = df.drop(
         "html",
         "_input_hash",
         "_task_hash",
-        ]
+        ],
+    # Newer examples are saved without the rendered fields
+    errors="ignore",
     )
 df.to_json("data/ume-final.jsonl", orient="records", lines=True)
\ No newline at end of file
@@ -0,0 +1,298 @@
+"""
+Ingest a CSV of new items into inputs/ as one or more JSONL subsets.
+
+The CSV is read in chunks, so it never has to fit in memory. Rows missing
+one of the required fields are skipped, and so are rows whose idx is already
+in inputs/, in an annotated dataset exported with annotation_store.py
+(--annotated) or earlier in the same CSV.
+
+Each row is assigned to a subset by a hash of its idx and --seed, so the same
+CSV and seed always give the same subsets, whatever the row order or chunk
+size. Subsets are given as PATH=SIZE:
+
+- With counts (--subset a.jsonl=158 --subset b.jsonl=50), the rows with the
+  lowest hashes go to the first subset, the next ones to the second and so
+  on. This takes a second pass over the CSV, and the subsets are written in
+  hash order, i.e. shuffled.
+- With fractions (--subset a.jsonl=0.25), the hash range is split instead,
+  in a single pass, and rows keep their order from the CSV.
+
+--rest PATH collects the rows that aren't in any subset, in CSV order. With
+--prerender, the LaTeX in every row written is rendered into the SVG cache
+as the chunks go by, so the recipes start with it already cached.
+
+Usage: python scripts/ingest.py data/items.csv
+           --subset inputs/ume-rating/subset-4.jsonl=158
+           [--rest inputs/ume-rating-single/subset-5.jsonl] [--seed 42]
+           [--annotated ume-final ume2] [--prerender] [--workers N]
+"""
+import argparse
+import hashlib
+import heapq
+import json
+import sys
+from collections import Counter
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "recipes"))
+from ume_render.fields import TEXT_KEYS  # noqa: E402
+
+REQUIRED_FIELDS = ["idx", *TEXT_KEYS]
+CHUNK_SIZE = 10_000
+HASH_RANGE = 2**64
+
+
+def row_key(idx, seed):
+    """A stable pseudo-random 64-bit key for an item, from its idx."""
+    digest = hashlib.blake2b(f"{seed}:{idx}".encode("utf8"), digest_size=8)
+    return int.from_bytes(digest.digest(), "big")
+
+
+def existing_ids(inputs_dir, exclude=()):
+    """The idx of every item in the JSONL files under `inputs_dir`."""
+    exclude = {Path(path).resolve() for path in exclude}
+    ids = set()
+    for path in sorted(Path(inputs_dir).glob("**/*.jsonl")):
+        # Re-running an ingest shouldn't find its own output
+        if path.resolve() in exclude:
+            continue
+        with path.open("r", encoding="utf8") as file_:
+            for line in file_:
+                if line.strip():
+                    ids.add(str(json.loads(line)["idx"]))
+    return ids
+
+
+def annotated_ids(datasets, store):
+    """The idx of every item in the exported annotations of `datasets`."""
+    from annotation_store import read_annotations
+
+    ids = set()
+    for dataset in datasets:
+        df = read_annotations(dataset, columns=["idx"], store=store)
+        if "idx" in df:
+            ids.update(df["idx"].dropna().astype(str))
+    return ids
+
+
+def parse_idx(idx):
+    """Numeric ids are written as numbers, like in the existing subsets."""
+    idx = idx.strip()
+    return int(idx) if idx.lstrip("-").isdigit() else idx
+
+
+def read_rows(path, seed, skip_ids, stats, chunk_size=CHUNK_SIZE):
+    """
+    Read the CSV at `path` in chunks and yield a list of (key, idx, line)
+    per chunk, for the valid rows whose idx isn't in `skip_ids` or earlier
+    in the file. `line` is the row as a line of JSON. Skipped rows are
+    counted in `stats`.
+    """
+    seen = set()
+    # Every value is read as a string, so the output doesn't depend on the
+    # types pandas would infer for each chunk
+    chunks = pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False)
+    for chunk in chunks:
+        missing = [field for field in REQUIRED_FIELDS if field not in chunk]
+        if missing:
+            raise ValueError(f"{path} has no {', '.join(missing)} column")
+        # Blank cells are written as null
+        chunk = chunk.mask(chunk.apply(lambda column: column.str.strip() == ""))
+        valid = chunk[REQUIRED_FIELDS].notna().all(axis=1)
+        stats["invalid"] += int((~valid).sum())
+        chunk = chunk[valid].copy()
+        chunk["idx"] = chunk["idx"].map(parse_idx)
+        if chunk.empty:
+            continue
+
+        rows = []
+        lines = chunk.to_json(orient="records", lines=True).splitlines()
+        for idx, line in zip(chunk["idx"], lines):
+            idx = str(idx)
+            if idx in skip_ids:
+                stats["existing"] += 1
+            elif idx in seen:
+                stats["duplicate"] += 1
+            else:
+                seen.add(idx)
+                rows.append((row_key(idx, seed), idx, line))
+        yield rows
+
+
+def parse_subsets(specs):
+    """Parse PATH=SIZE arguments into [(path, size)], sizes all int or float."""
+    subsets = []
+    for spec in specs:
+        path, sep, size = spec.rpartition("=")
+        if not sep or not path:
+            raise ValueError(f"Expected PATH=SIZE, got {spec!r}")
+        subsets.append((Path(path), float(size) if "." in size else int(size)))
+    kinds = {type(size) for _, size in subsets}
+    if len(kinds) > 1:
+        raise ValueError("Subset sizes must be all counts or all fractions")
+    if float in kinds and sum(size for _, size in subsets) > 1:
+        raise ValueError("Subset fractions add up to more than 1")
+    return subsets
+
+
+class Ingest:
+    """Writes the rows to their subsets, and pre-renders them if asked to."""
+
+    def __init__(self, subsets, rest, prerender, workers):
+        self.paths = [path for path, _ in subsets] + ([rest] if rest else [])
+        self.counts = Counter()
+        self.prerender = prerender
+        self.workers = workers
+        self.files = []
+        for path in self.paths:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self.files.append(path.open("w", encoding="utf8"))
+
+    def write(self, target, lines):
+        """Write `lines` to subset number `target` (the rest if past the end)."""
+        if target >= len(self.files) or not lines:
+            return
+        self.files[target].writelines(line + "\n" for line in lines)
+        self.counts[self.paths[target]] += len(lines)
+
+    def render(self, lines):
+        if not self.prerender or not lines:
+            return
+        from ume_render.latex import forget_prerendered
+        from ume_render.parallel import prerender_latex
+        from ume_render.tasks import rating_texts
+
+        items = [json.loads(line) for line in lines]
+        prerender_latex(rating_texts(items), self.workers, keep_pool=True)
+        # The SVGs are in the cache now; don't keep them all in memory too
+        forget_prerendered()
+
+    def close(self):
+        for file_ in self.files:
+            file_.close()
+        if self.prerender:
+            from ume_render.parallel import shutdown_pool
+
+            shutdown_pool()
+
+
+def ingest_fractions(rows_by_chunk, subsets, ingest):
+    bounds = []
+    total = 0.0
+    for _, fraction in subsets:
+        total += fraction
+        bounds.append(int(total * HASH_RANGE))
+    for rows in rows_by_chunk:
+        targets = [[] for _ in range(len(subsets) + 1)]
+        for key, _, line in rows:
+            target = next(
+                (i for i, bound in enumerate(bounds) if key < bound), len(subsets)
+            )
+            targets[target].append(line)
+        for target, lines in enumerate(targets):
+            ingest.write(target, lines)
+        ingest.render([line for _, _, line in rows])
+
+
+def ingest_counts(read, subsets, ingest):
+    # First pass: find the rows with the lowest keys, keeping only the keys
+    n_selected = sum(count for _, count in subsets)
+    lowest = []  # max-heap of the lowest keys, as negative numbers
+    for rows in read():
+        for key, _, _ in rows:
+            if len(lowest) < n_selected:
+                heapq.heappush(lowest, -key)
+            elif -key > lowest[0]:
+                heapq.heapreplace(lowest, -key)
+    selected = sorted(-key for key in lowest)
+    target_of = {}
+    start = 0
+    for target, (_, count) in enumerate(subsets):
+        for key in selected[start : start + count]:
+            target_of[key] = target
+        start += count
+
+    # Second pass: write the rest as it's read and collect the subsets, which
+    # are written in key order once they're complete
+    chosen = [[] for _ in subsets]
+    for rows in read():
+        rest = []
+        for key, _, line in rows:
+            if key in target_of:
+                chosen[target_of[key]].append((key, line))
+            else:
+                rest.append(line)
+        ingest.write(len(subsets), rest)
+        ingest.render(rest)
+    for target, rows in enumerate(chosen):
+        lines = [line for _, line in sorted(rows)]
+        ingest.write(target, lines)
+        ingest.render(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("csv", type=Path, help="CSV file of items")
+    parser.add_argument(
+        "--subset",
+        action="append",
+        default=[],
+        help="PATH=SIZE, a count or a fraction of the rows (repeatable)",
+    )
+    parser.add_argument("--rest", type=Path, help="Where to write the other rows")
+    parser.add_argument("--seed", default="42", help="Seed for the row hashes")
+    parser.add_argument("--inputs", type=Path, default=Path("inputs"))
+    parser.add_argument(
+        "--annotated", nargs="+", default=[], help="Exported datasets to skip"
+    )
+    parser.add_argument("--store", type=Path, default=Path("data/annotations"))
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument(
+        "--prerender", action="store_true", help="Render the LaTeX into the cache"
+    )
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    try:
+        subsets = parse_subsets(args.subset)
+    except ValueError as err:
+        parser.error(str(err))
+    if not subsets and not args.rest:
+        parser.error("Nothing to write: pass --subset and/or --rest")
+
+    outputs = [path for path, _ in subsets] + ([args.rest] if args.rest else [])
+    skip_ids = existing_ids(args.inputs, exclude=outputs)
+    if args.annotated:
+        skip_ids |= annotated_ids(args.annotated, args.store)
+    print(f"{len(skip_ids)} items already in {args.inputs} or annotated")
+
+    stats = Counter()
+
+    def read():
+        # Both passes count the same skipped rows; keep the last pass's counts
+        stats.clear()
+        return read_rows(args.csv, args.seed, skip_ids, stats, args.chunk_size)
+
+    ingest = Ingest(subsets, args.rest, args.prerender, args.workers)
+    try:
+        if subsets and isinstance(subsets[0][1], int):
+            ingest_counts(read, subsets, ingest)
+        else:
+            ingest_fractions(read(), subsets, ingest)
+    finally:
+        ingest.close()
+
+    print(
+        f"Skipped {stats['invalid']} rows missing a required field, "
+        f"{stats['existing']} already ingested or annotated and "
+        f"{stats['duplicate']} repeated in the CSV"
+    )
+    for path, _ in subsets:
+        print(f"{path}: {ingest.counts[path]} items")
+    if args.rest:
+        print(f"{args.rest}: {ingest.counts[args.rest]} items")
+    for path, count in subsets:
+        if isinstance(count, int) and ingest.counts[path] < count:
+            print(f"Warning: only {ingest.counts[path]} new items for {path}")
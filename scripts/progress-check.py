@@ -1,23 +1,71 @@
+"""
+Count the annotations in each Prodigy dataset and annotator session.
+
+The counts are computed by the database from the link and dataset tables,
+so no example content is transferred and the time taken depends on the
+number of datasets and sessions, not on the number of annotations. Works
+with the Postgres database from prodigy-production.json and the SQLite one
+from prodigy-local.json.
+
+Usage: python scripts/progress-check.py [--prefix ume-final] [--config prodigy-production.json]
+"""
+import argparse
 import json
 import os
-from collections import Counter
+from pathlib import Path
 
 import dotenv
 import pandas as pd
 import sqlalchemy
 
-dotenv.load_dotenv(".env")
+# Prodigy links every saved example to the dataset and to a session dataset
+# named after the annotator, e.g. "ume-final-alice"
+QUERY = """
+SELECT dataset.name, dataset.session, COUNT(link.id) AS n_examples
+FROM dataset
+LEFT JOIN link ON link.dataset_id = dataset.id
+GROUP BY dataset.id, dataset.name, dataset.session
+ORDER BY dataset.name
+"""
+
 
-engine = sqlalchemy.create_engine(os.getenv("PGCONN"))
+def database_url(config_path):
+    """The SQLAlchemy URL of the database a Prodigy config file uses."""
+    config = json.loads(Path(config_path).read_text())
+    db = config.get("db", "sqlite")
+    settings = config.get("db_settings", {}).get(db, {})
+    if db == "postgresql":
+        return os.getenv("PGCONN")
+    if db == "sqlite":
+        directory = settings.get("path", os.getenv("PRODIGY_HOME", "~/.prodigy"))
+        path = Path(directory).expanduser() / settings.get("name", "prodigy.db")
+        return f"sqlite:///{path}"
+    raise ValueError(f"Unsupported database in {config_path}: {db}")
 
-examples = pd.read_sql_table("example", con=engine)
 
-annotator_ids = []
-for i, row in examples.iterrows():
-    content = json.loads(row["content"])
-    annotator_id = content["_annotator_id"]
-    if annotator_id.startswith("ume-final"):
-        annotator_ids.append(annotator_id)
+parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+parser.add_argument(
+    "--prefix", default="ume-final", help="Only count sessions of these datasets"
+)
+parser.add_argument("--config", help="Prodigy config (default: $PRODIGY_CONFIG)")
+args = parser.parse_args()
+
+dotenv.load_dotenv(".env")
+config_path = args.config or os.getenv("PRODIGY_CONFIG", "prodigy-production.json")
+engine = sqlalchemy.create_engine(database_url(config_path))
+
+counts = pd.read_sql_query(QUERY, con=engine)
+counts["session"] = counts["session"].astype(bool)
+counts = counts[counts["name"].str.startswith(args.prefix)]
+datasets = counts[~counts["session"]]
+sessions = counts[counts["session"]]
 
-print(f"Total annotations: {len(annotator_ids)}")
-print(Counter(annotator_ids))
+print(f"Total annotations: {sessions['n_examples'].sum()}")
+print("\nPer dataset:")
+print(datasets[["name", "n_examples"]].to_string(index=False))
+print("\nPer session:")
+print(
+    sessions.sort_values("n_examples", ascending=False)[
+        ["name", "n_examples"]
+    ].to_string(index=False)
+)
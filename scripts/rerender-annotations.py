@@ -0,0 +1,40 @@
+"""
+Rebuild the rendered fields (display_*, a_*/b_*, html) that the recipes drop
+before saving, for annotations exported with `prodigy db-out`.
+
+Usage: python scripts/rerender-annotations.py data/ume-final.jsonl data/ume-final-rendered.jsonl
+"""
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "recipes"))
+from ume_render.tasks import (  # noqa: E402
+    rerender_adjudication_answer,
+    rerender_rating_answer,
+)
+from ume_render.templates import get_template  # noqa: E402
+
+input_file = Path(sys.argv[1])
+output_file = Path(sys.argv[2])
+
+rating_template = get_template("select-suggest")
+adjudication_template = get_template("adjudicate")
+
+n_examples = 0
+with input_file.open("r", encoding="utf8") as in_, output_file.open(
+    "w", encoding="utf8"
+) as out:
+    for line in in_:
+        if not line.strip():
+            continue
+        eg = json.loads(line)
+        # Only adjudication tasks record which fields were modified
+        if "modified" in eg:
+            eg = rerender_adjudication_answer(eg, adjudication_template)
+        else:
+            eg = rerender_rating_answer(eg, rating_template)
+        out.write(json.dumps(eg) + "\n")
+        n_examples += 1
+
+print(f"Wrote {n_examples} examples to {output_file}")
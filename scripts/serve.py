@@ -0,0 +1,285 @@
+"""
+Serve several recipes from one server, e.g. rating and adjudication together
+on one Render instance.
+
+Each service is NAME="RECIPE DATASET INPUTS [recipe options]", as it would
+follow `prodigy` on the command line. Everything the services have in common
+is done once, before they start: Prodigy, matplotlib and the recipes are
+imported, and the LaTeX in all their inputs is rendered with one pool of
+--workers processes (unless a service uses --compiled). Each service then
+runs in a process forked from this one, so they start with the rendered
+expressions in memory, and share the memory of everything loaded so far until
+they change it.
+
+The services listen on local ports, behind a proxy on --host/--port.
+Annotators open /NAME/?session=..., which the proxy passes to the service as
+/?session=.... Prodigy's app then requests its paths without the prefix, so
+these are routed by their Referer, which is the page's /NAME/ URL. Each tab
+stays on the service it was opened on. Requests that change data (anything
+but GET and HEAD) are rejected if they can't be routed that way. Other
+requests, e.g. health checks, go to the first service. Each service keeps
+its own database connection, since connections can't be shared across
+processes.
+
+Usage: python scripts/serve.py
+           rating="select-suggest ume3 compiled/ume-rating/ --compiled"
+           adjudication="adjudicate ume-adj inputs/ume-adjudication/a.jsonl"
+           [--host 0.0.0.0] [--port 10000] [--workers N]
+"""
+import argparse
+import asyncio
+import gc
+import importlib.util
+import json
+import multiprocessing
+import shlex
+import signal
+import socket
+import sys
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "recipes"))
+from ume_render import tasks  # noqa: E402
+from ume_render.latex import close_cache  # noqa: E402
+from ume_render.parallel import prerender_latex  # noqa: E402
+
+RECIPES = {
+    "select-suggest": {
+        "file": ROOT / "recipes" / "universal-math-exam" / "select-suggest.py",
+        "texts": tasks.rating_texts,
+    },
+    "adjudicate": {
+        "file": ROOT / "recipes" / "universal-math-exam-adjudication" / "adjudicate.py",
+        "texts": tasks.adjudication_texts,
+    },
+}
+# Largest request line and headers read before choosing a service
+HEAD_LIMIT = 64 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_service(spec):
+    name, sep, command = spec.partition("=")
+    args = shlex.split(command)
+    if not sep or len(args) < 3 or args[0] not in RECIPES:
+        raise argparse.ArgumentTypeError(
+            f'Expected NAME="RECIPE DATASET INPUTS ..." with a recipe in '
+            f"{list(RECIPES)}, got {spec!r}"
+        )
+    return {"name": name, "command": command, "recipe": args[0], "args": args}
+
+
+def read_items(inputs_path):
+    paths = (
+        sorted(inputs_path.glob("*.jsonl")) if inputs_path.is_dir() else [inputs_path]
+    )
+    for path in paths:
+        with path.open("r", encoding="utf8") as file_:
+            yield from (json.loads(line) for line in file_ if line.strip())
+
+
+def load_recipe(recipe):
+    """Import a recipe file, which registers its recipe with Prodigy."""
+    path = RECIPES[recipe]["file"]
+    spec = importlib.util.spec_from_file_location(path.stem.replace("-", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_service(command, port):
+    import prodigy
+
+    prodigy.serve(command, host="127.0.0.1", port=port)
+
+
+def service_prefix(path, services):
+    """The service named by the first segment of `path`, and the rest of it."""
+    name, sep, rest = path.lstrip("/").partition("/")
+    if name in services:
+        return name, sep, rest
+    return None, "", path
+
+
+def choose_service(head, services):
+    """
+    The service a request goes to, and the target to send it with. The
+    target is None if the request should be redirected to /NAME/ instead.
+    Raises ValueError if a request that changes data can't be routed.
+    """
+    request_line, *headers = head.decode("latin-1").split("\r\n")
+    method, target, version = request_line.split(" ", 2)
+    url = urlsplit(target)
+    name, sep, rest = service_prefix(url.path, services)
+    if name is not None:
+        # /NAME has to become /NAME/, so the page's own URL keeps the prefix
+        if not sep:
+            return name, None
+        return name, urlunsplit(("", "", "/" + rest, url.query, ""))
+    # The page's requests carry its URL, /NAME/?session=..., so each tab is
+    # routed to the service it was opened on
+    for header in headers:
+        key, _, value = header.partition(":")
+        if key.strip().lower() == "referer":
+            name = service_prefix(urlsplit(value.strip()).path, services)[0]
+            if name is not None:
+                return name, target
+    # Never guess where answers go; anything else, e.g. a health check or
+    # Prodigy's static files, can be served by any service
+    if method not in ("GET", "HEAD"):
+        raise ValueError(f"Can't tell which service {method} {url.path} is for")
+    return next(iter(services)), target
+
+
+def forward_head(head, target):
+    """
+    The request head for the service, with `target` and asking the service
+    to close the connection after it.
+    """
+    request_line, *headers = head.decode("latin-1").split("\r\n")
+    method, _, version = request_line.split(" ", 2)
+    headers = [
+        line
+        for line in headers
+        if line.partition(":")[0].strip().lower() not in ("connection", "keep-alive")
+    ]
+    # Before the blank lines at the end of the head
+    headers[-2:-2] = ["Connection: close"]
+    return "\r\n".join([f"{method} {target} {version}", *headers]).encode("latin-1")
+
+
+async def copy(reader, writer):
+    while True:
+        data = await reader.read(CHUNK_SIZE)
+        if not data:
+            return
+        writer.write(data)
+        await writer.drain()
+
+
+async def respond(writer, status, headers=()):
+    lines = [f"HTTP/1.1 {status}", *headers, "Content-Length: 0", "Connection: close"]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+    await writer.drain()
+    writer.close()
+
+
+def make_handler(ports):
+    async def handle(reader, writer):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            writer.close()
+            return
+        try:
+            name, target = choose_service(head, ports)
+        except ValueError as e:
+            print(f"WARNING: {e}")
+            await respond(writer, "400 Bad Request")
+            return
+        if target is None:
+            url = urlsplit(head.decode("latin-1").split(" ", 2)[1])
+            location = urlunsplit(("", "", f"/{name}/", url.query, ""))
+            await respond(writer, "302 Found", [f"Location: {location}"])
+            return
+        try:
+            backend_reader, backend_writer = await asyncio.open_connection(
+                "127.0.0.1", ports[name]
+            )
+        except OSError:
+            await respond(writer, "502 Bad Gateway")
+            return
+        # One request per connection, so the browser's next request is
+        # routed on its own rather than following this one
+        backend_writer.write(forward_head(head, target))
+        upload = asyncio.ensure_future(copy(reader, backend_writer))
+        try:
+            await copy(backend_reader, writer)
+        except ConnectionError:
+            pass
+        finally:
+            upload.cancel()
+            backend_writer.close()
+            writer.close()
+
+    return handle
+
+
+async def proxy(host, port, ports, processes):
+    server = await asyncio.start_server(
+        make_handler(ports), host, port, limit=HEAD_LIMIT
+    )
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    print(f"Serving {', '.join(ports)} on http://{host}:{port}")
+    async with server:
+        # Stop if a service exits, so the platform restarts the whole server
+        while not stop.is_set() and all(p.is_alive() for p in processes):
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=1.0)
+            except asyncio.TimeoutError:
+                pass
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+    return 0 if stop.is_set() else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("services", nargs="+", type=parse_service)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=10000)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processes to use for pre-rendering LaTeX",
+    )
+    args = parser.parse_args()
+    names = [service["name"] for service in args.services]
+    if len(set(names)) != len(names):
+        parser.error(f"Service names must be unique, got {names}")
+
+    texts = []
+    for service in args.services:
+        load_recipe(service["recipe"])
+        if "--compiled" in service["args"] or "-C" in service["args"]:
+            continue
+        items = read_items(Path(service["args"][2]))
+        texts.extend(RECIPES[service["recipe"]]["texts"](items))
+    # Expressions shared between services are only rendered once
+    n_rendered = prerender_latex(texts, args.workers)
+    print(f"Pre-rendered {n_rendered} expressions for {len(names)} services")
+    close_cache()
+    # Keep what's loaded so far out of the garbage collector, so the forked
+    # services don't copy memory they never change
+    gc.freeze()
+
+    ports = {}
+    processes = []
+    context = multiprocessing.get_context("fork")
+    for service in args.services:
+        ports[service["name"]] = free_port()
+        process = context.Process(
+            target=run_service,
+            args=(service["command"], ports[service["name"]]),
+            name=service["name"],
+        )
+        process.start()
+        processes.append(process)
+    return asyncio.run(proxy(args.host, args.port, ports, processes))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
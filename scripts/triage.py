@@ -0,0 +1,124 @@
+"""
+Triage rated items: which need more ratings, and which need adjudication.
+
+The rules are computed with group-wise aggregations over the whole
+annotation table instead of calling a Python function for every item, so
+they scale to many merged datasets. get_samples.py uses this module, and it
+can also be run on its own.
+
+Usage: python scripts/triage.py data/ume-final.jsonl data/ume2.jsonl
+           [--already-adjudicated data/Mar6data_ToAdjudicate.csv]
+"""
+import argparse
+
+import pandas as pd
+
+SCORE_COLUMNS = ["overall", "topic", "vocabulary", "choices"]
+TEXT_COLUMNS = ["question", "choice_A", "choice_B", "choice_C", "choice_D"]
+VALID_SCORES = [1, 2, 3]
+
+
+def prepare_scores(df):
+    """Treat empty answers as missing and convert the scores to numbers."""
+    df = df.replace("", pd.NA)
+    for column in SCORE_COLUMNS:
+        df[column] = pd.to_numeric(df[column], errors="coerce")
+    return df
+
+
+def completion_idx(df):
+    """
+    Return the idx of items with fewer than two complete ratings (every
+    score 1-3) from different annotators, in order of first appearance.
+    """
+    valid = df[SCORE_COLUMNS].isin(VALID_SCORES).all(axis=1)
+    n_annotators = df[valid].groupby("idx")["_annotator_id"].nunique()
+    rated = n_annotators.index[n_annotators >= 2]
+    idx = df["idx"].dropna()
+    return idx[~idx.isin(rated)].unique()
+
+
+def first_two_ratings(df):
+    """
+    The earliest complete rating of each annotator, for the first two
+    annotators to rate each item.
+    """
+    complete = df[df[SCORE_COLUMNS].notna().all(axis=1)]
+    earliest = complete.sort_values("_timestamp", kind="stable").drop_duplicates(
+        subset=["idx", "_annotator_id"]
+    )
+    return earliest[earliest.groupby("idx").cumcount() < 2]
+
+
+def adjudication_idx(df):
+    """
+    Return the idx of items whose first two ratings are both above 1 but
+    aren't both 3, i.e. the annotators only roughly agree.
+    """
+    ratings = first_two_ratings(df)
+    stats = (
+        ratings.assign(is_three=ratings["overall"] == 3)
+        .groupby("idx")
+        .agg(
+            n_ratings=("overall", "size"),
+            lowest=("overall", "min"),
+            all_three=("is_three", "all"),
+        )
+    )
+    selected = (stats["n_ratings"] == 2) & (stats["lowest"] > 1) & ~stats["all_three"]
+    return stats.index[selected]
+
+
+def consolidate_revisions(df):
+    """
+    Reduce the rows of each item to one, sorted by idx. The original text is
+    replaced with the revision in the item's second row, if there is one.
+    """
+    df = df.sort_values("idx", kind="stable")
+    position = df.groupby("idx").cumcount()
+    first = df[position == 0].set_index("idx")
+    second = df[position == 1].set_index("idx")
+    for column in TEXT_COLUMNS:
+        first.loc[second.index, f"{column}_orig"] = second[column]
+    return first.reset_index()
+
+
+def adjudication_items(df, exclude_idx=()):
+    """
+    Return one consolidated row per item that needs adjudication, leaving
+    out the items in `exclude_idx`.
+    """
+    df = df[~df["idx"].isin(exclude_idx)]
+    selected = df[df["idx"].isin(adjudication_idx(df))]
+    return consolidate_revisions(selected.drop(columns=["_timestamp", "_annotator_id"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("datasets", nargs="+", help="Exported annotation JSONL")
+    parser.add_argument(
+        "--already-adjudicated", help="CSV of items adjudicated outside of Prodigy"
+    )
+    parser.add_argument("--completion-output", help="Write completion idx to a CSV")
+    parser.add_argument("--adjudication-output", help="Write adjudication JSONL")
+    args = parser.parse_args()
+
+    df = pd.concat(pd.read_json(path, lines=True) for path in args.datasets)
+    df = prepare_scores(df)
+
+    for_completion_idx = completion_idx(df)
+    exclude_idx = set(for_completion_idx)
+    if args.already_adjudicated:
+        exclude_idx.update(pd.read_csv(args.already_adjudicated)["idx"])
+    for_adjudication = adjudication_items(df, list(exclude_idx))
+
+    print(f"For completion: {len(for_completion_idx)}")
+    print(f"For adjudication: {len(for_adjudication)}")
+    if args.completion_output:
+        pd.DataFrame({"idx": for_completion_idx}).to_csv(
+            args.completion_output, index=False
+        )
+    if args.adjudication_output:
+        for_adjudication.to_json(
+            args.adjudication_output, orient="records", lines=True
+        )
@@ -1,4 +1,7 @@
 export PRODIGY_HOME=$(pwd)
 
 python -m pip install -r requirements.txt
-python -m pip install prodigy -f https://${PRODIGY_KEY}@download.prodi.gy
\ No newline at end of file
+python -m pip install prodigy -f https://${PRODIGY_KEY}@download.prodi.gy
+
+# Pre-render the task files so the server starts without rendering
+python scripts/compile-tasks.py
\ No newline at end of file